@@ -0,0 +1,266 @@
+#------------------------------------------------------------------------#
+# DataGrid - Tabular Data Rendering Library
+# Copyright (C) 2009-2010 Adam Wagner <awagner@redventures.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#------------------------------------------------------------------------#
+
+"""Mergeable aggregate accumulators (partial states of separate groups merge
+into the state of their union)
+
+Protocol:
+    init: return new (empty) state
+    step: add one value to state, returning state
+    update: add list of values to state, returning state
+    merge: combine two states, returning state (may modify the first)
+    finalize: return aggregate result for state
+"""
+
+from abc import ABCMeta, abstractmethod
+
+import datagrid.aggregate
+
+
+class Accumulator(object):
+    """Abstract base class for accumulators"""
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def init(self):
+        """Return new state"""
+        pass
+
+    @abstractmethod
+    def step(self, state, value):
+        """Add value to state"""
+        pass
+
+    def update(self, state, values):
+        """Add each of values to state"""
+        for value in values:
+            state = self.step(state, value)
+        return state
+
+    @abstractmethod
+    def merge(self, state, other):
+        """Combine state with other state"""
+        pass
+
+    def finalize(self, state):
+        """Return aggregate result for state"""
+        return state
+
+
+class Sum(Accumulator):
+    """Accumulator for sum
+
+    Example:
+    >>> acc = Sum()
+    >>> acc.finalize(acc.merge(acc.update(acc.init(), [1, 2]),
+    ...         acc.update(acc.init(), [3])))
+    6
+    """
+
+    def init(self):
+        return 0
+
+    def step(self, state, value):
+        return state + value
+
+    def update(self, state, values):
+        return state + sum(values)
+
+    def merge(self, state, other):
+        return state + other
+
+
+class Min(Accumulator):
+    """Accumulator for min (state is None until a value is seen)
+
+    Example:
+    >>> acc = Min()
+    >>> acc.finalize(acc.merge(acc.update(acc.init(), [3, 2]), acc.init()))
+    2
+    """
+    method = min
+
+    def init(self):
+        return None
+
+    def step(self, state, value):
+        return value if state is None else self.method(state, value)
+
+    def update(self, state, values):
+        if not len(values):
+            return state
+        return self.step(state, self.method(values))
+
+    def merge(self, state, other):
+        return state if other is None else self.step(state, other)
+
+    def finalize(self, state):
+        # same failure as the method itself for an empty set of values
+        return self.method([]) if state is None else state
+
+
+class Max(Min):
+    """Accumulator for max"""
+    method = max
+
+
+class Avg(Accumulator):
+    """Accumulator for datagrid.aggregate.avg (state is [total, count])
+
+    Example:
+    >>> acc = Avg()
+    >>> acc.finalize(acc.merge(acc.update(acc.init(), [1.0, 2.0]),
+    ...         acc.update(acc.init(), [6.0])))
+    3.0
+    """
+
+    def init(self):
+        return [0, 0]
+
+    def step(self, state, value):
+        state[0] += value
+        state[1] += 1
+        return state
+
+    def update(self, state, values):
+        state[0] += sum(values)
+        state[1] += len(values)
+        return state
+
+    def merge(self, state, other):
+        state[0] += other[0]
+        state[1] += other[1]
+        return state
+
+    def finalize(self, state):
+        return state[0] / state[1]
+
+
+class Count(Accumulator):
+    """Accumulator for datagrid.aggregate.count (state maps value to count)
+
+    Example:
+    >>> acc = Count()
+    >>> acc.finalize(acc.merge(acc.update(acc.init(), ['red', 'blue']),
+    ...         acc.update(acc.init(), ['red'])))
+    '1 blue, 2 red'
+    """
+
+    def init(self):
+        return {}
+
+    def step(self, state, value):
+        state[value] = state.get(value, 0) + 1
+        return state
+
+    def merge(self, state, other):
+        for value, count in other.iteritems():
+            state[value] = state.get(value, 0) + count
+        return state
+
+    def finalize(self, state):
+        return datagrid.aggregate.format_counts(state)
+
+
+class DistinctLen(Accumulator):
+    """Accumulator for datagrid.aggregate.distinct_len (state is a set)
+
+    Example:
+    >>> acc = DistinctLen()
+    >>> acc.finalize(acc.merge(acc.update(acc.init(), ['a', 'b']),
+    ...         acc.update(acc.init(), ['b', 'c'])))
+    3
+    """
+
+    def init(self):
+        return set()
+
+    def step(self, state, value):
+        state.add(value)
+        return state
+
+    def update(self, state, values):
+        state.update(values)
+        return state
+
+    def merge(self, state, other):
+        state |= other
+        return state
+
+    def finalize(self, state):
+        return len(state)
+
+
+class Collect(Accumulator):
+    """Fallback accumulator for plain aggregate callables: values are
+    collected, and the callable is run on them when finalized.
+
+    Example:
+    >>> acc = Collect(sorted)
+    >>> acc.finalize(acc.merge(acc.update(acc.init(), [3, 1]), [2]))
+    [1, 2, 3]
+    """
+
+    def __init__(self, method):
+        self.method = method
+
+    def init(self):
+        return []
+
+    def step(self, state, value):
+        state.append(value)
+        return state
+
+    def update(self, state, values):
+        state.extend(values)
+        return state
+
+    def merge(self, state, other):
+        state.extend(other)
+        return state
+
+    def finalize(self, state):
+        return self.method(state)
+
+
+# Accumulators for known aggregate methods
+ACCUMULATORS = {
+        sum: Sum(),
+        min: Min(),
+        max: Max(),
+        datagrid.aggregate.avg: Avg(),
+        datagrid.aggregate.count: Count(),
+        datagrid.aggregate.distinct_len: DistinctLen()}
+
+
+def accumulator(method):
+    """Return accumulator for aggregate method (an Accumulator, a known
+    aggregate method or any other callable of a list of values)
+
+    Example:
+    >>> accumulator(sum).__class__.__name__
+    'Sum'
+    >>> accumulator(len).__class__.__name__
+    'Collect'
+    """
+    if isinstance(method, Accumulator):
+        return method
+    try:
+        return ACCUMULATORS[method]
+    except (KeyError, TypeError):
+        return Collect(method)
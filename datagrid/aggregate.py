@@ -18,7 +18,10 @@
 
 """Aggregate Method Library"""
 
-from operator import countOf
+from collections import defaultdict
+
+# Names of the aggregate methods (see datagrid.aggregatetools.parse_options)
+METHODS = ('count', 'distinct_len', 'avg')
 
 
 def count(values): 
@@ -28,8 +31,20 @@ def count(values):
     >>> count(['red', 'green', 'red', 'blue'])
     '1 blue, 1 green, 2 red'
     """
-    return ', '.join(str(countOf(values, x)) + ' ' + str(x) 
-            for x in sorted(set(values)))
+    counts = defaultdict(int)
+    for value in values:
+        counts[value] += 1
+    return format_counts(counts)
+
+
+def format_counts(counts):
+    """Format mapping of value to count (as count does)
+
+    Example:
+    >>> format_counts({'red': 2, 'blue': 1})
+    '1 blue, 2 red'
+    """
+    return ', '.join(str(counts[x]) + ' ' + str(x) for x in sorted(counts))
 
 
 def distinct_len(values):
@@ -21,31 +21,71 @@
 import __builtin__
 
 import datagrid.aggregate
+import datagrid.approximate
+
+
+# Aggregate methods by name, found in datagrid.aggregate and
+#   datagrid.approximate (before __builtin__, see parse_options)
+METHODS = dict([(name, vars(datagrid.approximate)[name]) 
+        for name in datagrid.approximate.METHODS]
+        + [(name, vars(datagrid.aggregate)[name]) 
+        for name in datagrid.aggregate.METHODS])
+
+# Functions returning aggregate methods from parameters, by name
+FACTORIES = dict((name, vars(datagrid.approximate)[name]) 
+        for name in datagrid.approximate.FACTORIES)
+
 
 def parse_options(aggregation):
-    """Parse string aggregation options and return a format suitable for
+    """Parse string aggregation options (METHODS or builtins, and FACTORIES
+    given their parameters after a colon) and return a format suitable for
     datagrid.core
-    
+
     Example:
     >>> aggregation = parse_options(['colA|count', 'colB|max'])
     >>> aggregation['colA'].func_name
     'count'
     >>> aggregation['colB'].__doc__[:3]
     'max'
+    >>> parse_options(['colC|approx_percentile:0.9'])['colC'].q
+    0.9
+    >>> parse_options(['colD|approx_top_k'])['colD'].k
+    10
+    >>> parse_options(['colE|approx_percentile'])
+    Traceback (most recent call last):
+        ...
+    ValueError: Invalid parameters for approx_percentile: ''
     """
     # Create dictionary from simple list of strings,
     aggregation = dict(a.split('|') for a in aggregation)
 
-    # Replace string aggregation requests from dictionary with function
-    # from datagrid.aggregate module
-    if aggregation:
-        for key, method_name in aggregation.iteritems():
-            # Look for method from aggregate first and __builtin__ second
+    # Replace string aggregation requests from dictionary with methods
+    for key, method_name in aggregation.iteritems():
+        method_name, params = method_name.partition(':')[::2]
+        params = [_parameter(p) for p in params.split(',')] if params else []
+
+        if method_name in FACTORIES:
             try:
-                method = vars(datagrid.aggregate)[method_name]
+                method = FACTORIES[method_name](*params)
+            except (TypeError, ValueError):
+                raise ValueError('Invalid parameters for %s: %r' 
+                        % (method_name, ','.join(map(str, params))))
+        elif params:
+            raise ValueError('%s takes no parameters' % method_name)
+        else:
+            # Look for method from METHODS first and __builtin__ second
+            try:
+                method = METHODS[method_name]
             except KeyError:
                 method = vars(__builtin__)[method_name]
-            aggregation[key] = method
+        aggregation[key] = method
 
     return aggregation
 
+
+def _parameter(value):
+    """Convert method parameter to int (or float)"""
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
@@ -0,0 +1,306 @@
+#------------------------------------------------------------------------#
+# DataGrid - Tabular Data Rendering Library
+# Copyright (C) 2009-2010 Adam Wagner <awagner@redventures.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#------------------------------------------------------------------------#
+
+"""Approximate (bounded-memory) Aggregate Method Library
+
+    approx_distinct: distinct value count (HyperLogLog)
+    approx_percentile(q), approx_median: value at a quantile (KLL sketch)
+    approx_top_k(k): most frequent values (Misra-Gries summary)
+"""
+
+import math
+import random
+from heapq import nlargest, nsmallest
+from itertools import islice
+
+from datagrid.accumulate import Accumulator
+
+
+# Mask of 64-bit hash values
+_MASK = (1 << 64) - 1
+
+# 2 ** -r for each HyperLogLog register value r
+_INVERSE_POWERS = [2.0 ** -r for r in xrange(66)]
+
+
+def hash64(value):
+    """Return well-mixed 64-bit hash of value (equal values hash equally)
+
+    Example:
+    >>> hash64(1) == hash64(1.0), hash64(1) == hash64(2)
+    (True, False)
+    """
+    # splitmix64 finalizer, spreading python's hash over all 64 bits
+    x = hash(value) & _MASK
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & _MASK
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & _MASK
+    return x ^ (x >> 31)
+
+
+class ApproxAccumulator(Accumulator):
+    """Base class of approximate accumulators, callable as aggregate methods
+    """
+
+    def __call__(self, values):
+        return self.finalize(self.update(self.init(), values))
+
+
+class ApproxDistinct(ApproxAccumulator):
+    """Accumulator for approximate distinct counts (HyperLogLog, standard
+    error about 1.04 / sqrt(2 ** precision): 1.6% by default)
+
+    Example:
+    >>> acc = ApproxDistinct()
+    >>> acc.finalize(acc.merge(acc.update(acc.init(), ['a', 'b']),
+    ...         acc.update(acc.init(), ['b', 'c'])))
+    3
+    >>> abs(approx_distinct(range(100000)) - 100000) < 5000
+    True
+    """
+
+    def __init__(self, precision=12, exact=64):
+        self.precision = precision
+        self.registers = 1 << precision
+        self.exact = exact
+
+    def init(self):
+        return set()
+
+    def step(self, state, value):
+        return self._insert(state, hash64(value))
+
+    def update(self, state, values):
+        for value in values:
+            state = self._insert(state, hash64(value))
+        return state
+
+    def merge(self, state, other):
+        if isinstance(other, set):
+            for h in other:
+                state = self._insert(state, h)
+            return state
+        if isinstance(state, set):
+            state = self._dense(state)
+        state[:] = bytearray(map(max, state, other))
+        return state
+
+    def finalize(self, state):
+        if isinstance(state, set):
+            return len(state)
+        m = self.registers
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(
+                map(_INVERSE_POWERS.__getitem__, state))
+
+        # small cardinalities are better estimated from empty registers
+        empty = state.count('\x00')
+        if estimate <= 2.5 * m and empty:
+            estimate = m * math.log(float(m) / empty)
+        return int(round(estimate))
+
+    def _insert(self, state, h):
+        """Add value hash to state, returning state"""
+        if isinstance(state, set):
+            state.add(h)
+            if len(state) > self.exact:
+                state = self._dense(state)
+            return state
+
+        # register chosen by the leading bits, holding the longest run of
+        #   leading zeros seen in the remaining bits (plus one)
+        bits = 64 - self.precision
+        i = h >> bits
+        rank = bits - (h & ((1 << bits) - 1)).bit_length() + 1
+        if rank > state[i]:
+            state[i] = rank
+        return state
+
+    def _dense(self, hashes):
+        """Return registers holding a set of hashes"""
+        state = bytearray(self.registers)
+        for h in hashes:
+            self._insert(state, h)
+        return state
+
+
+class ApproxPercentile(ApproxAccumulator):
+    """Accumulator for the approximate value at quantile q (0 to 1) of ordered
+    values (KLL sketch, ranks within about 1.7 / k: 1% by default)
+
+    Example:
+    >>> acc = ApproxPercentile(0.5)
+    >>> acc.finalize(acc.merge(acc.update(acc.init(), [5, 1, 4]),
+    ...         acc.update(acc.init(), [2, 3])))
+    3
+    >>> abs(approx_percentile(0.9)(range(100000)) - 90000) < 2000
+    True
+    """
+
+    def __init__(self, q, k=200):
+        if not 0 <= q <= 1:
+            raise ValueError('Quantile must be between 0 and 1')
+        self.q = q
+        self.k = k
+        # compaction keeps odd or even positions; a seeded generator keeps
+        #   results repeatable from run to run
+        self.random = random.Random(0)
+
+    def init(self):
+        return [[]]
+
+    def step(self, state, value):
+        state[0].append(value)
+        return self._compress(state)
+
+    def update(self, state, values):
+        state[0].extend(values)
+        return self._compress(state)
+
+    def merge(self, state, other):
+        for h, compactor in enumerate(other):
+            if h < len(state):
+                state[h].extend(compactor)
+            else:
+                state.append(list(compactor))
+        return self._compress(state)
+
+    def finalize(self, state):
+        weighted = sorted((value, 1 << h)
+                for h, compactor in enumerate(state) for value in compactor)
+        if not weighted:
+            # same failure as the exact methods on an empty set of values
+            raise ValueError('%s of empty sequence' % type(self).__name__)
+        total = sum(weight for value, weight in weighted)
+        rank = max(1, int(math.ceil(self.q * total)))
+        seen = 0
+        for value, weight in weighted:
+            seen += weight
+            if seen >= rank:
+                return value
+        return weighted[-1][0]
+
+    def _capacity(self, h, height):
+        """Return capacity of compactor h in a sketch of height compactors
+        (capacities shrink geometrically below the top compactor)"""
+        return int(math.ceil(self.k * (2.0 / 3) ** (height - h - 1))) + 1
+
+    def _compress(self, state):
+        """Compact full compactors until the sketch is within capacity"""
+        while True:
+            height = len(state)
+            if sum(len(c) for c in state) < sum(self._capacity(h, height)
+                    for h in xrange(height)):
+                return state
+            for h, compactor in enumerate(state):
+                if len(compactor) >= self._capacity(h, height):
+                    if h + 1 == len(state):
+                        state.append([])
+                    compactor.sort()
+                    # an odd value out stays behind
+                    keep = compactor.pop() if len(compactor) % 2 else None
+                    state[h + 1].extend(islice(compactor,
+                            self.random.randint(0, 1), None, 2))
+                    compactor[:] = [] if keep is None else [keep]
+                    break
+
+
+class ApproxTopK(ApproxAccumulator):
+    """Accumulator for the k most frequent values (Misra-Gries summary),
+    formatted as datagrid.aggregate.count formats counts
+
+    Example:
+    >>> acc = ApproxTopK(2)
+    >>> acc.finalize(acc.merge(acc.update(acc.init(), ['red', 'blue']),
+    ...         acc.update(acc.init(), ['red', 'green', 'red'])))
+    '3 red, 1 blue'
+    """
+
+    def __init__(self, k=10, counters=None):
+        self.k = k
+        self.counters = counters or max(8 * k, 128)
+
+    def init(self):
+        return {}
+
+    def step(self, state, value):
+        state[value] = state.get(value, 0) + 1
+        return self._prune(state)
+
+    def update(self, state, values):
+        # count chunks exactly, pruning back to size between them
+        values = iter(values)
+        size = 4 * self.counters
+        for chunk in iter(lambda: list(islice(values, size)), []):
+            for value in chunk:
+                state[value] = state.get(value, 0) + 1
+            state = self._prune(state)
+        return state
+
+    def merge(self, state, other):
+        for value, count in other.iteritems():
+            state[value] = state.get(value, 0) + count
+        return self._prune(state)
+
+    def finalize(self, state):
+        top = nsmallest(self.k, state.iteritems(), 
+                key=lambda item: (-item[1], item[0]))
+        return ', '.join('%s %s' % (count, value) for value, count in top)
+
+    def _prune(self, state):
+        """Reduce state to at most counters values, lowering every count by
+        the largest count that is dropped"""
+        if len(state) <= self.counters:
+            return state
+        cut = nlargest(self.counters + 1, state.itervalues())[-1]
+        for value, count in state.items():
+            if count <= cut:
+                del state[value]
+            else:
+                state[value] = count - cut
+        return state
+
+
+# Approximate aggregate methods
+approx_distinct = ApproxDistinct()
+approx_median = ApproxPercentile(0.5)
+
+# Names of the aggregate methods, and of the functions returning aggregate 
+#   methods from parameters (see datagrid.aggregatetools.parse_options)
+METHODS = ('approx_distinct', 'approx_median')
+FACTORIES = ('approx_percentile', 'approx_top_k')
+
+
+def approx_percentile(q, k=200):
+    """Return aggregate method for the approximate value at quantile q
+    (see ApproxPercentile)
+
+    Example:
+    >>> approx_percentile(0.25)([4, 3, 2, 1])
+    1
+    """
+    return ApproxPercentile(q, k)
+
+
+def approx_top_k(k=10, counters=None):
+    """Return aggregate method for the k most frequent values (see
+    ApproxTopK)
+
+    Example:
+    >>> approx_top_k(1)(['a', 'b', 'b'])
+    '2 b'
+    """
+    return ApproxTopK(k, counters)
@@ -0,0 +1,261 @@
+#------------------------------------------------------------------------#
+# DataGrid - Tabular Data Rendering Library
+# Copyright (C) 2009-2010 Adam Wagner <awagner@redventures.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#------------------------------------------------------------------------#
+
+"""Rendered result cache, keyed on a fingerprint of the input data and the
+normalized grid configuration and renderer"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from copy import copy
+from functools import partial
+from hashlib import sha1
+from types import CodeType, ModuleType
+
+
+# Default memory budget of the in-process tier (bytes)
+DEFAULT_MEMORY = 32 * 1024 * 1024
+
+# Default time to live of cached results (seconds)
+DEFAULT_TTL = 60 * 60
+
+
+def file_fingerprint(path):
+    """Return fingerprint of a data file: its path, modification time and
+    size
+
+    Example:
+    >>> file_fingerprint(__file__) == file_fingerprint(__file__)
+    True
+    """
+    stat = os.stat(path)
+    return ('file', os.path.abspath(path), stat.st_mtime, stat.st_size)
+
+
+def content_fingerprint(content):
+    """Return fingerprint of data read from a stream (eg: stdin): a hash of
+    its content
+
+    Example:
+    >>> content_fingerprint('a\\n1\\n') == content_fingerprint('a\\n2\\n')
+    False
+    """
+    return ('content', sha1(content).hexdigest())
+
+
+def normalize(value):
+    """Return a stable, comparable description of a configuration value
+    (callables by module and name, other objects by their public attributes)
+
+    Example:
+    >>> normalize({'b': [1, 2], 'a': sum})
+    (('a', '__builtin__.sum'), ('b', (1, 2)))
+    """
+    if value is None or isinstance(value, (bool, int, long, float,
+            basestring)):
+        return value
+    if isinstance(value, dict):
+        return tuple(sorted((normalize(k), normalize(v))
+                for k, v in value.iteritems()))
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(normalize(v) for v in value))
+
+    if isinstance(value, partial):
+        return ('functools.partial', normalize(value.func),
+                normalize(value.args), normalize(value.keywords))
+    code = getattr(value, 'func_code', None)
+    if code is not None and getattr(sys.modules.get(value.__module__),
+            value.__name__, None) is not value:
+        # functions not found by module and name (anonymous and nested
+        #   ones) are told apart by their code, defaults, the values they
+        #   close over and the globals they read
+        cells = [cell.cell_contents for cell in value.func_closure or ()]
+        names = dict((name, value.func_globals[name])
+                for name in code.co_names if name in value.func_globals)
+        return (_code_key(code), normalize(value.func_defaults),
+                normalize(cells), normalize(names))
+    if hasattr(value, '__name__'):
+        return '%s.%s' % (getattr(value, '__module__', None),
+                value.__name__)
+    if hasattr(value, '__dict__'):
+        return ('%s.%s' % (type(value).__module__, type(value).__name__),
+                normalize(dict((k, v) for k, v in vars(value).iteritems()
+                if not k.startswith('_'))))
+    return repr(value)
+
+
+def _code_key(code):
+    """Return comparable description of a code object (by definition site,
+    bytecode and constants)"""
+    return (code.co_filename, code.co_firstlineno, code.co_code,
+            tuple(_code_key(c) if isinstance(c, CodeType) else normalize(c)
+            for c in code.co_consts))
+
+
+def cache_key(fingerprint, config, renderer=None):
+    """Return cache key (hex string) for the rendered output of data with
+    the given fingerprint, configuration and renderer
+
+    Example:
+    >>> key = cache_key(('content', 'abc'), {'groupby': ['a']}, 'csv')
+    >>> key == cache_key(('content', 'abc'), {'groupby': ['a']}, 'csv')
+    True
+    >>> key == cache_key(('content', 'abc'), {'groupby': ['b']}, 'csv')
+    False
+    """
+    return sha1(repr(normalize((fingerprint, config, renderer)))).hexdigest()
+
+
+def renderer_config(renderer):
+    """Return configuration of a renderer: its module, or its class and
+    public attributes (its options)
+
+    Example:
+    >>> import datagrid.renderer.html
+    >>> renderer_config(datagrid.renderer.html.Renderer())
+    ('datagrid.renderer.html.Renderer', (('html_class', 'datagrid'), ('html_id', 'datagrid')))
+    """
+    if isinstance(renderer, ModuleType):
+        return renderer.__name__
+    return ('%s.%s' % (type(renderer).__module__, type(renderer).__name__),
+            normalize(dict((k, v) for k, v in vars(renderer).iteritems()
+            if not k.startswith('_'))))
+
+
+def grid_config(grid):
+    """Return configuration of a DataGrid: every setting its result depends
+    on (see datagrid.core.SETTINGS)"""
+    from datagrid.core import SETTINGS
+    return dict((name, getattr(grid, name)) for name in SETTINGS)
+
+
+class ResultCache(object):
+    """Cache of rendered output by key (see cache_key) for ttl seconds,
+    held in memory up to a byte budget (least recently used out first)
+    and, given a directory, on disk.  Safe to share between threads.
+
+    Example:
+    >>> cache = ResultCache(memory=10)
+    >>> cache.set('a', '12345'); cache.set('b', '12345'); cache.get('a')
+    '12345'
+    >>> cache.set('c', '12345'); cache.get('b') is None
+    True
+    """
+
+    def __init__(self, memory=DEFAULT_MEMORY, directory=None,
+            ttl=DEFAULT_TTL):
+        self.memory = memory
+        self.directory = directory
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return cached output for key (None if not cached, or expired)"""
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                created, output = entry
+                if time.time() - created <= self.ttl:
+                    # most recently used entries are last
+                    self.entries[key] = entry
+                    return output
+                self.size -= len(output)
+
+        entry = self._read(key)
+        if entry is None:
+            return None
+        self._remember(key, *entry)
+        return entry[1]
+
+    def set(self, key, output):
+        """Cache output for key"""
+        self._remember(key, time.time(), output)
+        self._write(key, output)
+
+    def render(self, grid, renderer, fingerprint):
+        """Return output of grid rendered by renderer (see DataGrid.render),
+        cached for data with the given fingerprint.  A copy of the renderer
+        renders, leaving its state (and so its key) as it was."""
+        key = cache_key(fingerprint, grid_config(grid), 
+                renderer_config(renderer))
+        output = self.get(key)
+        if output is None:
+            if not isinstance(renderer, ModuleType):
+                renderer = copy(renderer)
+            output = grid.render(renderer)
+            self.set(key, output)
+        return output
+
+    def clear(self):
+        """Drop every cached result held in memory"""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _remember(self, key, created, output):
+        """Hold output (created at the given time) in memory, evicting least
+        recently used results beyond the memory budget"""
+        if len(output) > self.memory:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[1])
+            self.entries[key] = (created, output)
+            self.size += len(output)
+            while self.size > self.memory:
+                key, (created, output) = self.entries.popitem(last=False)
+                self.size -= len(output)
+
+    def _path(self, key):
+        """Return path of disk cache file for key"""
+        return os.path.join(self.directory, 'datagrid-%s' % key)
+
+    def _read(self, key):
+        """Return (creation time, output) cached on disk for key (None if
+        not cached, or expired)"""
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            created = os.path.getmtime(path)
+            if time.time() - created > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, 'rb') as cachefile:
+                return created, cachefile.read()
+        except (IOError, OSError):
+            return None
+
+    def _write(self, key, output):
+        """Cache output on disk for key (written whole, then renamed into
+        place, so readers never see part of it)"""
+        if self.directory is None:
+            return
+        handle, name = tempfile.mkstemp(prefix='.datagrid-',
+                dir=self.directory)
+        with os.fdopen(handle, 'wb') as cachefile:
+            cachefile.write(output)
+        os.rename(name, self._path(key))
@@ -18,6 +18,10 @@
 
 """DataGrid Calculation Tools"""
 
+import re
+import ast
+import math
+import operator
 from abc import ABCMeta
 
 
@@ -35,6 +39,16 @@ class CalculatedValueError(Exception):
     pass
 
 
+class CircularCalculationError(CalculatedValueError):
+    """Calculated columns depend on each other in a cycle"""
+    pass
+
+
+class InvalidFormulaError(ValueError):
+    """Formula could not be parsed, or uses a construct that is not allowed"""
+    pass
+
+
 def calculatevalues(data, calculations):
     """Calculate given formulas on data
 
@@ -91,6 +105,121 @@ def calculatevalues(data, calculations):
     return data
 
 
+def compile_vector_formula(calc_string, columns, vectors):
+    """Generate formula (a function of no arguments) evaluated once over whole
+    column vectors (ie: numpy arrays)
+
+    Params:
+        - calc_string: formula, with column references written as {name}
+        - columns: list of column names, in vector order
+        - vectors: list of column vectors supporting arithmetic operators
+
+    Example:
+    >>> from fractions import Fraction
+    >>> f = compile_vector_formula('{a} * 2', ['a'], [Fraction(1, 3)])
+    >>> f()
+    Fraction(2, 3)
+    """
+    positions = _positions(columns)
+    env = {}
+    def reference(name):
+        vector = '_c%d' % positions[name]
+        env[vector] = vectors[positions[name]]
+        return ast.Name(vector, ast.Load())
+    function = _compile(calc_string, reference, False, env)
+    return lambda: function(None)
+
+
+def compile_calculations(calculations, columns):
+    """Compile calculated column formulas (evaluated in dependency order, see
+    calculation_order) into a function extending a row with their values
+
+    Params:
+        - calculations: dictionary of column name to formula string
+        - columns: all column names, raw columns followed by calculated 
+            columns
+
+    Example:
+    >>> calc = compile_calculations({'c': '{b} * 2', 'b': '{a} + 1', 
+    ...         'd': '{a} / 0', 'e': '{x}'}, ['a', 'x', 'b', 'c', 'd', 'e'])
+    >>> calc([1, ''])
+    [1, '', 2.0, 4.0, 0, '--']
+    """
+    order = calculation_order(dict((k, formula_references(v)) 
+            for k, v in calculations.iteritems()))
+    steps = [(columns.index(k), compile_formula(calculations[k], columns)) 
+            for k in order]
+    width = len(columns) - len(calculations)
+    blank = [''] * len(calculations)
+
+    def calculate(row):
+        """Return copy of raw values in row with calculated values added"""
+        row = list(row[:width])
+        row.extend(blank)
+        for i, calc in steps:
+            try: 
+                row[i] = calc(row)
+            except ZeroDivisionError:
+                row[i] = 0
+            except CalculationFailureError:
+                row[i] = '--'
+        return row
+    return calculate
+
+
+def calculation_order(dependencies):
+    """Order calculations so that each follows the calculations it depends on
+
+    Params:
+        - dependencies: dictionary of calculation name to the names it 
+            references (names that are not calculations are ignored)
+
+    Raises CircularCalculationError (with the offending cycle) if 
+    calculations depend on each other in a cycle.
+
+    Example:
+    >>> calculation_order({'c': ['b', 'a'], 'b': ['a'], 'd': ['c', 'b']})
+    ['b', 'c', 'd']
+    >>> calculation_order({'a': ['b'], 'b': ['c'], 'c': ['a']})
+    Traceback (most recent call last):
+        ...
+    CircularCalculationError: ['a', 'b', 'c', 'a']
+    """
+    order, done, path = [], set(), []
+
+    def visit(name):
+        if name in done:
+            return
+        if name in path:
+            raise CircularCalculationError(path[path.index(name):] + [name])
+        path.append(name)
+        for dependency in dependencies[name]:
+            if dependency in dependencies:
+                visit(dependency)
+        path.pop()
+        done.add(name)
+        order.append(name)
+
+    for name in sorted(dependencies):
+        visit(name)
+    return order
+
+
+def formula_references(calc_string):
+    """Return names of the columns referenced by formula, in order of first
+    reference
+
+    Example:
+    >>> formula_references('{a} + {b} / {a}')
+    ['a', 'b']
+    """
+    names = []
+    for name in _REFERENCE.findall(calc_string):
+        if name not in names:
+            names.append(name)
+    return names
+
+
 def formula(calc_string):
     """Generate formula to run on given data
 
@@ -99,13 +228,8 @@ def formula(calc_string):
     >>> f({'a': 1, 'b': 1})
     2.0
     """
-    # replace place-holders with dictionary refs
-    calc_string = calc_string.replace('{', 'float(d["').replace('}', '"])')
+    return _compile(calc_string, _key_reference, numeric=True)
 
-    # create new function and return
-    calc_method = None
-    exec 'calc_method = lambda d: ' + calc_string  # pylint: disable-msg=W0122
-    return calc_method
 
 def bool_formula(calc_string):
     """Generate formula to run on given data
@@ -115,10 +239,253 @@ def bool_formula(calc_string):
     >>> f({'a': 1, 'b': 2})
     True
     """
-    # replace place-holders with dictionary refs
-    calc_string = calc_string.replace('{', 'd["').replace('}', '"]')
+    return _compile(calc_string, _key_reference, numeric=False)
+
+
+def compile_formula(calc_string, columns, numeric=True):
+    """Generate formula to run on a row sequence, column references are 
+    resolved to positions in columns.
 
-    # create new function and return
-    calc_method = None
-    exec 'calc_method = lambda d: ' + calc_string  # pylint: disable-msg=W0122
-    return calc_method
+    Params:
+        - calc_string: formula, with column references written as {name}
+        - columns: list of column names, in row order
+        - numeric: convert referenced values with float (as formula does),
+            otherwise use them as-is (as bool_formula does)
+
+    Raises KeyError for references to columns not found in columns.
+
+    Example:
+    >>> f = compile_formula('{b} * 2', ['a', 'b'])
+    >>> f([1, 4])
+    8.0
+    >>> f = compile_formula("{a} == 'x'", ['a', 'b'], numeric=False)
+    >>> f(('x', 4))
+    True
+    """
+    positions = _positions(columns)
+    reference = lambda name: _row_reference(positions[name])
+    return _compile(calc_string, reference, numeric)
+
+
+def compile_column_formula(calc_string, columns, vectors, numeric=True):
+    """Generate formula to run on a row index, reading values straight from
+    the given column vectors (see datagrid.columnar)
+
+    Params:
+        - calc_string: formula, with column references written as {name}
+        - columns: list of column names, in vector order
+        - vectors: list of column vectors (indexable by row index)
+        - numeric: convert referenced values with float
+
+    Example:
+    >>> f = compile_column_formula('{a} > 1', ['a'], [[1, 2]], False)
+    >>> f(0), f(1)
+    (False, True)
+    """
+    positions = _positions(columns)
+    env = {}
+    def reference(name):
+        vector = '_c%d' % positions[name]
+        env[vector] = vectors[positions[name]]
+        return ast.Subscript(ast.Name(vector, ast.Load()), 
+                ast.Index(ast.Name(_ROW, ast.Load())), ast.Load())
+    def encoded(name):
+        column = vectors[positions[name]]
+        if not hasattr(column, 'lookup'):
+            return None
+        vector = '_e%d' % positions[name]
+        env[vector] = column.codes
+        return ast.Subscript(ast.Name(vector, ast.Load()), 
+                ast.Index(ast.Name(_ROW, ast.Load())), ast.Load()), \
+                column.lookup
+    return _compile(calc_string, reference, numeric, env, encoded)
+
+
+# Name of row argument within compiled formulas
+_ROW = '_r'
+
+# Functions and constants formulas may refer to by name
+_SAFE_NAMES = dict((f.__name__, f) 
+        for f in (abs, min, max, round, float, int, str, len, bool))
+_SAFE_NAMES.update({'True': True, 'False': False, 'None': None})
+
+# Syntax allowed within formulas (anything else is rejected)
+_SAFE_NODES = (ast.Expression, ast.BoolOp, ast.BinOp, ast.UnaryOp, 
+        ast.Compare, ast.IfExp, ast.Call, ast.Num, ast.Str, ast.Tuple, 
+        ast.List, ast.Name, ast.Subscript, ast.Index, ast.Slice, ast.Load,
+        ast.boolop, ast.operator, ast.unaryop, ast.cmpop)
+
+# Operators evaluated at compile time when all operands are constants
+_FOLD_OPERATORS = {
+        ast.Add: operator.add, ast.Sub: operator.sub, 
+        ast.Mult: operator.mul, ast.Div: operator.div, 
+        ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+        ast.Pow: operator.pow, ast.USub: operator.neg, 
+        ast.UAdd: operator.pos}
+
+# Largest constant power (or shift) formulas may hold, in bits
+_MAX_CONSTANT_BITS = 64 * 1024
+
+# Placeholder syntax for column references
+_REFERENCE = re.compile(r'\{([^}]*)\}')
+
+
+def _positions(columns):
+    """Map column names to positions"""
+    return dict((name, i) for i, name in enumerate(columns))
+
+
+def _key_reference(name):
+    """AST for looking up a column by name (d["name"])"""
+    return ast.Subscript(ast.Name(_ROW, ast.Load()), 
+            ast.Index(ast.Str(name)), ast.Load())
+
+
+def _row_reference(position):
+    """AST for looking up a column by position (r[position])"""
+    return ast.Subscript(ast.Name(_ROW, ast.Load()), 
+            ast.Index(ast.Num(position)), ast.Load())
+
+
+def _compile(calc_string, reference, numeric=True, env=None, encoded=None):
+    """Parse, validate and fold formula into a function of one row argument,
+    reading columns through the ASTs given by reference (and encoded)"""
+    # swap {name} references for placeholder identifiers so the formula 
+    #   parses as a python expression
+    names = []
+    def placeholder(match):
+        names.append(match.group(1))
+        return '_p%d' % (len(names) - 1)
+    source = _REFERENCE.sub(placeholder, calc_string)
+
+    try:
+        tree = ast.parse(source.strip(), '<formula>', 'eval')
+    except SyntaxError, e:
+        raise InvalidFormulaError(calc_string, str(e))
+
+    placeholders = dict(('_p%d' % i, n) for i, n in enumerate(names))
+    body = _Compiler(placeholders, reference, numeric, encoded).visit(
+            tree.body)
+
+    function = ast.Expression(ast.Lambda(ast.arguments(
+            [ast.Name(_ROW, ast.Param())], None, None, []), body))
+    code = compile(ast.fix_missing_locations(function), '<formula>', 'eval')
+
+    env = dict(env or {}, **_SAFE_NAMES)
+    env['__builtins__'] = {}
+    return eval(code, env)  # pylint: disable-msg=W0123
+
+
+class _Compiler(ast.NodeTransformer):
+    """Validate formula syntax tree, resolve column references and fold 
+    constant expressions"""
+
+    def __init__(self, placeholders, reference, numeric, encoded=None):
+        self.placeholders = placeholders
+        self.reference = reference
+        self.numeric = numeric
+        self.encoded = encoded
+
+    def generic_visit(self, node):
+        if not isinstance(node, _SAFE_NODES):
+            raise InvalidFormulaError('%s is not allowed in formulas' 
+                    % type(node).__name__)
+        return ast.NodeTransformer.generic_visit(self, node)
+
+    def visit_Name(self, node):
+        if node.id in self.placeholders:
+            value = self.reference(self.placeholders[node.id])
+            if self.numeric:
+                value = ast.Call(ast.Name('float', ast.Load()), [value], 
+                        [], None, None)
+            return ast.copy_location(value, node)
+        if node.id not in _SAFE_NAMES:
+            raise InvalidFormulaError('unknown name: %s' % node.id)
+        return node
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.starargs \
+                or node.kwargs or node.keywords:
+            raise InvalidFormulaError('only simple function calls are '
+                    'allowed in formulas')
+        return self.generic_visit(node)
+
+    def visit_Compare(self, node):
+        if self.encoded is not None and not self.numeric:
+            coded = self._coded_compare(node)
+            if coded is not None:
+                return ast.copy_location(coded, node)
+        return self.generic_visit(node)
+
+    def _coded_compare(self, node):
+        """Return equality test of an encoded column against string 
+        constants as a test of its codes (None if node is anything else)"""
+        if len(node.ops) != 1:
+            return None
+        left, op, right = node.left, node.ops[0], node.comparators[0]
+        if isinstance(op, (ast.Eq, ast.NotEq)):
+            if isinstance(left, ast.Str):
+                left, right = right, left
+            if not isinstance(right, ast.Str):
+                return None
+            constants = [right.s]
+        elif isinstance(op, (ast.In, ast.NotIn)) \
+                and isinstance(right, (ast.Tuple, ast.List)) \
+                and all(isinstance(e, ast.Str) for e in right.elts):
+            constants = [e.s for e in right.elts]
+        else:
+            return None
+        if not isinstance(left, ast.Name) or left.id not in self.placeholders:
+            return None
+        coded = self.encoded(self.placeholders[left.id])
+        if coded is None:
+            return None
+
+        # constants missing from the column get a code no row holds
+        codes, lookup = coded
+        constants = [ast.Num(lookup.get(c, -1)) for c in constants]
+        if isinstance(op, (ast.Eq, ast.NotEq)):
+            return ast.Compare(codes, [op], constants)
+        return ast.Compare(codes, [op], [ast.Tuple(constants, ast.Load())])
+
+    def visit_BinOp(self, node):
+        node = self.generic_visit(node)
+        if isinstance(node.left, ast.Num) and isinstance(node.right, ast.Num):
+            if _constant_bits(node.op, node.left.n, node.right.n) \
+                    > _MAX_CONSTANT_BITS:
+                raise InvalidFormulaError('constant too large in formulas')
+            return self._fold(node, node.op, node.left.n, node.right.n)
+        return node
+
+    def visit_UnaryOp(self, node):
+        node = self.generic_visit(node)
+        if isinstance(node.operand, ast.Num):
+            return self._fold(node, node.op, node.operand.n)
+        return node
+
+    def _fold(self, node, op, *operands):
+        """Replace constant operation with its result (if possible)"""
+        try:
+            method = _FOLD_OPERATORS[type(op)]
+            return ast.copy_location(ast.Num(method(*operands)), node)
+        except (KeyError, ArithmeticError, TypeError, ValueError):
+            return node
+
+
+def _constant_bits(op, left, right):
+    """Return estimated size (bits) of the integer result of a constant power
+    or left shift (0 for other operations)
+
+    Example:
+    >>> _constant_bits(ast.Pow(), 2, 10), _constant_bits(ast.LShift(), 1, 8)
+    (10, 9)
+    >>> _constant_bits(ast.Pow(), 2.0, 10), _constant_bits(ast.Add(), 1, 8)
+    (0, 0)
+    """
+    if not (isinstance(left, (int, long)) and isinstance(right, (int, long))):
+        return 0
+    if isinstance(op, ast.Pow) and right > 0 and abs(left) > 1:
+        return int(math.ceil(right * math.log(abs(left), 2)))
+    if isinstance(op, ast.LShift) and right > 0:
+        return abs(left).bit_length() + right
+    return 0
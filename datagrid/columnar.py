@@ -0,0 +1,291 @@
+#------------------------------------------------------------------------#
+# DataGrid - Tabular Data Rendering Library
+# Copyright (C) 2009-2010 Adam Wagner <awagner@redventures.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#------------------------------------------------------------------------#
+
+"""Columnar (column-at-a-time) data storage, subsets of rows being described
+by selections (arrays of row indexes)"""
+
+from array import array
+from itertools import izip
+
+from datagrid.datatools import group_tree
+from datagrid.typetools import NULL, EMPTY
+
+
+class ColumnTypeError(Exception):
+    """Value can not be stored in the given column type."""
+    pass
+
+
+class ObjectColumn(list):
+    """Column of arbitrary values (plain list)"""
+
+    def take(self, selection):
+        """Return values found at the given row indexes
+
+        Example:
+        >>> ObjectColumn([None, 'a', 3]).take([2, 0])
+        [3, None]
+        """
+        return [self[i] for i in selection]
+
+
+class NumericColumn(object):
+    """Column of numbers backed by a typed array (empty cells are kept aside,
+    by position)"""
+    typecode = None
+    accepts = ()
+
+    def __init__(self, values=()):
+        self.values = array(self.typecode)
+        self.empty = {}
+        for value in values:
+            self.append(value)
+
+    def append(self, value):
+        """Append value to column (ColumnTypeError if it does not belong)"""
+        if type(value) not in self.accepts:
+            if value not in EMPTY:
+                raise ColumnTypeError(value)
+            self.empty[len(self.values)] = value
+            value = 0
+        try:
+            self.values.append(value)
+        except OverflowError:
+            raise ColumnTypeError(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        if i in self.empty:
+            return self.empty[i]
+        return self.values[i]
+
+    def __iter__(self):
+        empty = self.empty
+        for i, value in enumerate(self.values):
+            yield empty[i] if i in empty else value
+
+    def take(self, selection):
+        """Return values found at the given row indexes
+
+        Example:
+        >>> c = FloatColumn([1.5, '', 3.0, None])
+        >>> c.take([3, 2, 1, 0])
+        [None, 3.0, '', 1.5]
+        """
+        values, empty = self.values, self.empty
+        if not empty:
+            return [values[i] for i in selection]
+        return [empty[i] if i in empty else values[i] for i in selection]
+
+
+class FloatColumn(NumericColumn):
+    """Column of floats (array('d'))"""
+    typecode = 'd'
+    accepts = (float,)
+
+
+class IntColumn(NumericColumn):
+    """Column of ints (array('l'))"""
+    typecode = 'l'
+    accepts = (int,)
+
+
+class EncodedColumn(object):
+    """Dictionary-encoded column of strings (rows hold integer codes, NULL
+    being encoded as any string is)
+
+    Example:
+    >>> c = EncodedColumn(['north', 'south', None, 'north'])
+    >>> list(c.codes), c.values
+    ([0, 1, 2, 0], ['north', 'south', None])
+    >>> c[3], c[2]
+    ('north', None)
+    """
+    accepts = (str, unicode)
+
+    def __init__(self, values=()):
+        self.codes = array('l')
+        self.values = []
+        self.lookup = {}
+        for value in values:
+            self.append(value)
+
+    def append(self, value):
+        """Append value to column (ColumnTypeError if it does not belong)"""
+        if type(value) not in self.accepts and value is not NULL:
+            raise ColumnTypeError(value)
+        try:
+            code = self.lookup[value]
+        except KeyError:
+            code = self.lookup[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+    def __iter__(self):
+        values = self.values
+        for code in self.codes:
+            yield values[code]
+
+    def take(self, selection):
+        """Return values found at the given row indexes"""
+        values, codes = self.values, self.codes
+        return [values[codes[i]] for i in selection]
+
+
+class EmptyColumn(ObjectColumn):
+    """Placeholder for a column that has only seen empty values ('' or NULL)
+    """
+
+    def append(self, value):
+        """Append value to column (ColumnTypeError if it is not empty)"""
+        if value not in EMPTY:
+            raise ColumnTypeError(value)
+        ObjectColumn.append(self, value)
+
+
+def new_column(value):
+    """Return an empty column suited to store the given value
+
+    Example:
+    >>> new_column(1.0).__class__.__name__
+    'FloatColumn'
+    >>> new_column('a').__class__.__name__
+    'EncodedColumn'
+    >>> new_column(None).__class__.__name__
+    'ObjectColumn'
+    """
+    for column in (FloatColumn, IntColumn, EncodedColumn):
+        if type(value) in column.accepts:
+            return column()
+    return ObjectColumn()
+
+
+class ColumnStore(object):
+    """Columnar replacement for a list of row lists, read a row at a time
+    (short rows are padded with empty values)
+
+    Example:
+    >>> s = ColumnStore([['a', '', 2], ['b', 1.0, 3], ['c', 2.0, 'x']])
+    >>> len(s), s[1]
+    (3, ['b', 1.0, 3])
+    >>> list(s)
+    [['a', '', 2], ['b', 1.0, 3], ['c', 2.0, 'x']]
+    >>> [c.__class__.__name__ for c in s.columns]
+    ['EncodedColumn', 'FloatColumn', 'ObjectColumn']
+    """
+
+    def __init__(self, rows=()):
+        self.columns = []
+        self.length = 0
+        for row in rows:
+            self.append(row)
+
+    def append(self, row):
+        """Append row of values to store"""
+        if not self.columns:
+            self.columns = [EmptyColumn() for _ in row]
+        width = len(self.columns)
+        if len(row) < width:
+            row = list(row) + [''] * (width - len(row))
+
+        for i, value in izip(xrange(width), row):
+            column = self.columns[i]
+            try:
+                column.append(value)
+            except ColumnTypeError:
+                if isinstance(column, EmptyColumn):
+                    # first non-empty value decides the column type
+                    new = new_column(value)
+                    for empty in column:
+                        new.append(empty)
+                else:
+                    new = ObjectColumn(column)
+                new.append(value)
+                self.columns[i] = new
+        self.length += 1
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        return [column[i] for column in self.columns]
+
+    def __iter__(self):
+        return (list(row) for row in izip(*self.columns))
+
+    def selection(self):
+        """Return selection covering every row in store"""
+        return array('l', xrange(self.length))
+
+    def take(self, column, selection):
+        """Return values of column (by index) for the selected rows"""
+        return self.columns[column].take(selection)
+
+    def rows(self, selection, extra=()):
+        """Generate row lists for the selected rows (followed by values from
+        extra columns)"""
+        columns = self.columns + list(extra)
+        for i in selection:
+            yield [column[i] for column in columns]
+
+    def filter(self, predicate, selection):
+        """Return selection of rows for which predicate(row index) is true
+
+        Example:
+        >>> s = ColumnStore([[1.0], [2.0], [3.0]])
+        >>> list(s.filter(lambda i: s.columns[0][i] > 1, s.selection()))
+        [1, 2]
+        """
+        return array('l', (i for i in selection if predicate(i)))
+
+    def group_tree(self, columns, selection):
+        """Group selection on the given columns (by index), returning a group
+        tree (see datagrid.datatools.group_tree) whose groups hold selections
+
+        Example:
+        >>> s = ColumnStore([['b', 1], ['a', 2], ['b', 3]])
+        >>> tree = s.group_tree([0], s.selection())
+        >>> [(v, list(tree[v].items)) for v in sorted(tree)]
+        [('a', [1]), ('b', [0, 2])]
+        """
+        columns = [self.columns[i] for i in columns]
+        keys = [c.codes.__getitem__ if isinstance(c, EncodedColumn) 
+                else c.__getitem__ for c in columns]
+        tree = group_tree(selection, keys, lambda: array('l'))
+        return _decode_keys(tree, [c.values if isinstance(c, EncodedColumn)
+                else None for c in columns])
+
+
+def _decode_keys(tree, tables):
+    """Replace the codes keying each level of a group tree with their values
+    (for levels that have a decoding table)"""
+    table, tables = tables[0], tables[1:]
+    if tables:
+        for node in tree.itervalues():
+            node.children = _decode_keys(node.children, tables)
+    if table is None:
+        return tree
+    return dict((table[code], node) for code, node in tree.iteritems())
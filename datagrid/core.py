@@ -20,12 +20,36 @@
 """The module provides the main DataGrid class."""
 
 import itertools
+import multiprocessing
+from collections import deque
 from copy import copy
+from operator import itemgetter
 from string import ascii_uppercase
-from itertools import ifilter
 
-from datagrid.calctools import bool_formula, formula, calculatevalues
-from datagrid.datatools import multi_sorted
+from datagrid.accumulate import accumulator
+from datagrid.calctools import formula, calculatevalues, compile_formula, \
+        compile_column_formula, compile_calculations
+from datagrid.datatools import sorted_window, group_tree, group_leaves, \
+        pivot_cells, MappedRows, RowStream
+from datagrid.formattools import batch_formatter
+from datagrid.typetools import NULL, EMPTY
+from datagrid.columnar import ColumnStore
+from datagrid.vectorized import NumpyStore
+from datagrid.result import CompiledGrid, CompiledSets, ResultGroup, \
+        ResultRow, ResultStream
+from datagrid import extsort
+
+
+# Available storage/computation backends (see DataGrid.__init__)
+BACKENDS = ('python', 'numpy')
+
+# DataGrid attributes that a compiled result depends on (besides data)
+SETTINGS = ('labels', 'descriptions', 'groupby', 'aggregate', 
+        'suppressdetail', 'calculatedcolumns', 'sortby', 'columns', 
+        'formatters', 'cellstyles', 'rowstyles', 'columnstyles', 'filters',
+        'post_aggregate_filters', 'backend', 'limit', 'offset', 'sortmemory',
+        'parallel', 'groupingsets', 'rollup', 'cube', 'pivot', 
+        'windowcolumns')
 
 
 class ColumnDoesNotExistError(Exception):
@@ -43,24 +67,59 @@ class DataGrid(object):
 
     Provides:
         __init__: receive incoming params and set instance defaults
+        compile: return (cached) render-ready result of the grid
         render: return compiled representation of tabular data
+        iter_render: generate compiled representation in chunks
+        render_to: write compiled representation to file-like object
         
-        _normalize: prepare instance vars for render
-        _render_body: render grouped segment of data
-        _render_cells: render block of cells within a single row
-        _render_row: render row of data
-        _compile_aggregate_data: aggregate summary data
+        _settings: snapshot of the settings a compiled result depends on
+        _compile: compile data into a render-ready result
+        _normalize: prepare working vars for compile
+        _compile_groups: compile one level of a group tree
+        _group_rows: aggregate rows of one level of a group tree
+        _window_groups: order and window one level of groups
+        _compile_group: compile group with the rows beneath it
+        _compile_parallel: compile groups across a process pool
+        _compile_partition: compile the groups of one data partition
+        _compile_sets: compile grouping sets
+        _compile_set: compile the aggregate rows of one grouping set
+        _compile_pivot: compile pivot table
+        _compile_rows: compile detail rows
+        _stream_rows: compile a stream of detail rows
+        _sorted_rows: sort and window detail rows
+        _window_rows: add window columns to sorted detail rows
+        _result_row: style and format row of data
+        _result_rows: style and format detail rows, column by column
+        _total_row: grand total row from aggregate states
+        _aggregate: compute partial aggregate states, rolling groups up
+        _accumulate: compute partial aggregate states of ungrouped data
+        _accumulating: aggregate a stream of rows as it passes
+        _compile_aggregate_data: aggregate summary data from partial states
+        _parallel: whether groups are compiled across a process pool
+        _streamed: whether row data is a one-pass stream
+        _filter_data: apply filters to data
+        _post_filter: apply post aggregate filters to row
+        _group_tree: partition data into tree of groups
+        _column_predicate: compile filter against columnar data
+        _load: place data in the grid's storage
+        _detail_rows: detail rows with calculated columns
+        _rows, _column_values: row/column access that works for both row 
+            and columnar data
     """
 
     def __init__(self, data, labels=None, descriptions=None, groupby=None, 
             aggregate=None, suppressdetail=False, calculatedcolumns=None, 
             sortby=None, columns=None, formatters=None, cellstyles=None,
             rowstyles=None, columnstyles=None, filters=None,
-            post_aggregate_filters=None):
+            post_aggregate_filters=None, columnar=False, backend='python',
+            limit=None, offset=None, sortmemory=None, parallel=None,
+            groupingsets=None, rollup=None, cube=None, pivot=None,
+            windowcolumns=None, staticdata=False):
         """Receive incoming params and set instance defaults.
         
         Params:
-            data: two-dimensional dataset to render
+            data: two-dimensional dataset to render: a list of rows or any
+                iterable of rows (an iterator is read once, lazily)
             labels: column name list (for all columns)
             descriptions: long description of what is contained in a column
             groupby: group data into given sets
@@ -77,6 +136,30 @@ class DataGrid(object):
             filters: Filter out rows for while the filter method returns false
             post_aggregate_filters: filter rows after being included in
                 aggregate
+            columnar: (bool) hold data in a column-oriented store
+                (datagrid.columnar.ColumnStore) instead of a list of rows
+            backend: 'python' (default) or 'numpy' to hold numeric columns
+                in ndarrays and vectorize calculations and aggregates
+                (datagrid.vectorized, implies columnar)
+            limit: maximum number of rows displayed at the top level, or
+                a list of limits by level (each group level, then detail)
+            offset: number of leading rows skipped at each level (as limit)
+            sortmemory: memory budget (bytes) for row data; rows beyond it are
+                spooled to temporary files and sorted externally
+            parallel: number of worker processes compiling a grouped grid, rows
+                partitioned on the first groupby column
+            groupingsets: list of grouping sets (lists of column names), each
+                aggregated into its own section of aggregate rows in one pass
+            rollup: list of columns adding the grouping sets of each of its
+                leading subsets (longest first, down to the grand total)
+            cube: list of columns adding the grouping sets of every one of
+                its subsets
+            pivot: (rowkeys, columnkey, value, aggregate) to render a pivot
+                table, with a column per distinct value of columnkey
+            windowcolumns: new columns computed across the sorted detail
+                rows of each deepest group (see datagrid.window)
+            staticdata: (bool) rows given as a list are not changed in place,
+                so their compiled result may be cached (see compile)
 
         Example:
         >>> d = DataGrid([[1,2,3],[4,5,6]], ['col-a', 'col-b', 'col-c'])
@@ -84,8 +167,16 @@ class DataGrid(object):
         [[1, 2, 3], [4, 5, 6]]
         >>> d.labels
         ['col-a', 'col-b', 'col-c']
+        >>> d = DataGrid([[1,2,3],[4,5,6]], columnar=True)
+        >>> d.data[1]
+        [4, 5, 6]
         """
-        self.data = list(data)
+        if backend not in BACKENDS:
+            raise ValueError("Unknown backend '%s'" % backend)
+        self.backend = backend
+        self.columnar = columnar or backend == 'numpy'
+        self.sortmemory = sortmemory
+        self.data = self._load(data)
         self.labels = labels or []
         self.descriptions = descriptions or {}
         self.groupby = groupby or []
@@ -100,6 +191,15 @@ class DataGrid(object):
         self.columnstyles = columnstyles or []
         self.filters = filters or []
         self.post_aggregate_filters = post_aggregate_filters or []
+        self.limit = limit
+        self.offset = offset
+        self.parallel = parallel
+        self.groupingsets = groupingsets or []
+        self.rollup = rollup or []
+        self.cube = cube or []
+        self.pivot = pivot
+        self.windowcolumns = windowcolumns or {}
+        self.staticdata = staticdata
         self.renderer = None
 
         # working 'private' vars
@@ -107,6 +207,22 @@ class DataGrid(object):
         self._allcolumns = None
         self._displaycolumns = None
         self._calculatedcolumns = None
+        self._calculate = None
+        self._calculatedvectors = None
+        self._datacolumns = None
+        self._windowfunctions = None
+        self._filters = None
+        self._post_aggregate_filters = None
+        self._rowstyles = None
+        self._cellstyles = None
+        self._columnstyles = None
+        self._columns = None
+        self._sortby = None
+        self._formatters = None
+        self._batchformatters = None
+        self._accumulators = None
+        self._windows = None
+        self._compiled = None
 
 
     def render(self, renderer):
@@ -125,46 +241,153 @@ class DataGrid(object):
         >>> type(d.render(renderer))
         <type 'str'>
         """
-        # make sure we have something to render
-        if not len(self.data):
-            raise NothingToRenderError()
+        self.renderer = renderer
+        return self.compile().render(renderer)
 
-        # prepare for render
-        self._normalize()
 
-        # Filter data
-        data = (dict(zip(self._rawcolumns, x)) for x in self.data)
-        if self.filters:
-            for d in self.filters:
-                f = bool_formula(d)
-                data = ifilter(f, data)
-            self.data = []
-            for r in data:
-                row = []
-                for c in self._rawcolumns:
-                    row.append(r[c])
-                self.data.append(row)
-
-        # run renderer setup logic (if we have any)
+    def iter_render(self, renderer):
+        """Compile data into requested tabular form, returning an iterator of
+        output chunks
+
+        Params:
+            renderer: object/module used to render data into requested form
+
+        Example:
+        >>> import datagrid.renderer.csv_
+        >>> d = DataGrid([[1,2,3],[4,5,6]], ['col-a', 'col-b', 'col-c'])
+        >>> list(d.iter_render(datagrid.renderer.csv_.Renderer()))
+        ['col-a,col-b,col-c\\r\\n', '1,2,3\\r\\n', '4,5,6\\r\\n', '']
+        """
         self.renderer = renderer
-        if hasattr(self.renderer, 'setup'): 
-            self.renderer.setup(self)
+        return self.compile().iter_render(renderer)
 
-        # build table pieces and glue together
-        head = self.renderer.head(self)
 
-        # render body if we are suppressing detail on a flat set
-        if not self.suppressdetail or self.groupby:
-            body = self._render_body(self.data, self.groupby)
-        else:
-            body = ''
+    def render_to(self, fileobj, renderer):
+        """Render data into requested tabular form, writing output to fileobj
+        as it is produced (see iter_render).
+
+        Params:
+            fileobj: file-like object with a write method
+            renderer: object/module used to render data into requested form
+        """
+        for chunk in self.iter_render(renderer):
+            fileobj.write(chunk)
+
 
-        taildata = self._add_calculated_columns(
-                self._compile_aggregate_data(self.data))
-        tail = self.renderer.tail(self, self._render_cells(taildata))
+    def compile(self, refresh=False):
+        """Group, aggregate, calculate, sort, style and format the data into a
+        render-ready datagrid.result.CompiledGrid (cached until it changes,
+        for data held by the grid or given as staticdata)
 
-        # render table and return
-        return self.renderer.table(self, head, body, tail)
+        Params:
+            refresh: (bool) ignore any cached result
+
+        Example:
+        >>> d = DataGrid([[1,2,3],[4,5,6]], ['col-a', 'col-b', 'col-c'],
+        ...         staticdata=True)
+        >>> result = d.compile()
+        >>> [row.data for row in result.rows()]
+        [(1, 2, 3), (4, 5, 6)]
+        >>> d.compile() is result
+        True
+        >>> d.sortby = [('col-a', 'desc')]
+        >>> [row.data for row in d.compile().rows()]
+        [(4, 5, 6), (1, 2, 3)]
+        """
+        # data may have been replaced since __init__
+        self.data = self._load(self.data)
+
+        # rows of a list may be changed in place, unseen by the settings
+        if not self.staticdata and isinstance(self.data, list):
+            refresh = True
+
+        settings = self._settings()
+        if refresh or self._compiled is None \
+                or self._compiled[0] is not self.data \
+                or self._compiled[1] != settings:
+            self._compiled = (self.data, settings, self._compile())
+        return self._compiled[2]
+
+
+    def _settings(self):
+        """Return snapshot of the grid settings (see SETTINGS) and data 
+        length, to tell whether a compiled result is still current."""
+        length = None if self._streamed() else len(self.data)
+        return (length,) + tuple(copy(getattr(self, name)) 
+                for name in SETTINGS)
+
+
+    def _compile(self):
+        """Compile data into a datagrid.result.CompiledGrid (CompiledSets 
+        for grouping sets)"""
+        # make sure we have something to render
+        if not self.data:
+            raise NothingToRenderError()
+        if self.pivot:
+            return self._compile_pivot()
+
+        # prepare for compile
+        self._normalize()
+        sets = grouping_sets(self.groupingsets, self.rollup, self.cube)
+        if sets and self.groupby:
+            raise ValueError('groupby can not be combined with grouping sets')
+
+        # Filter data (a parallel compile filters each partition in its 
+        #   worker)
+        parallel = self._parallel()
+        data = self._filter_data() if not parallel else None
+
+        # calculate whole columns at once where the backend allows it
+        if self.backend == 'numpy':
+            self._calculatedvectors = self.data.calculate(
+                    self.calculatedcolumns, self._datacolumns)
+        else:
+            self._calculatedvectors = None
+
+        if sets:
+            return self._compile_sets(data, sets)
+
+        # group data, aggregating each leaf group once and rolling parent 
+        #   groups and totals up from their children
+        if parallel:
+            body, totals = self._compile_parallel()
+        elif self.groupby:
+            groups = self._group_tree(data, self.groupby)
+            totals = self._aggregate(groups)
+            body = self._compile_groups(groups, self.groupby)
+        elif self._external() or self._streamed():
+            # stream rows (through the external sort), aggregating as they go
+            totals = dict((i, acc.init()) 
+                    for i, acc in self._accumulators.iteritems())
+            rows = self._accumulating(data, totals)
+            if self.suppressdetail:
+                deque(rows, 0)
+                body = []
+            else:
+                body = self._stream_rows(rows, totals)
+        else:
+            totals = self._accumulate(data)
+            # no body if we are suppressing detail on a flat set
+            if not self.suppressdetail:
+                body = self._compile_rows(data, lambda: 
+                        self._add_calculated_columns(
+                        self._compile_aggregate_data(totals)))
+            else:
+                body = []
+
+        # grand total aggregate row; totals of a one-pass body are complete
+        #   once it (and any rows beyond its display window) has been read
+        if isinstance(body, ResultStream) and iter(body.rows) is body.rows:
+            grid = copy(self)
+            def tail():
+                deque(rows, 0)
+                return grid._total_row(totals)
+        else:
+            tail = self._total_row(totals)
+
+        return CompiledGrid(self._columns, self._allcolumns, self.labels,
+                self.descriptions, self.groupby, self.suppressdetail, body,
+                tail)
 
 
     def _normalize(self):
@@ -178,187 +401,755 @@ class DataGrid(object):
                 (k, formula(v) if isinstance(v, str) else v)
                 for k, v in self.calculatedcolumns.iteritems())
 
-        # append any calculated columns to our list of columns we have
-        self._allcolumns = tuple(itertools.chain(self._rawcolumns, 
+        # append any calculated columns to our list of columns we have, 
+        #   followed by any window columns
+        self._datacolumns = tuple(itertools.chain(self._rawcolumns, 
                 self._calculatedcolumns.keys()))
+        self._allcolumns = self._datacolumns + tuple(self.windowcolumns)
         
         # alias for easier readability below
         idx = self._allcolumns.index        
         
-        # change column names to indexes
-        self.aggregate = dict((idx(k), v) 
+        # change column names to indexes; aggregate methods become mergeable
+        #   accumulators
+        self._accumulators = dict((idx(k), accumulator(v)) 
                 for k, v in self.aggregate.iteritems())
-        self.formatters = dict((idx(k), v)
+        self._formatters = dict((idx(k), v)
                 for k, v in self.formatters.iteritems())
+        self._batchformatters = [(k, batch_formatter(v))
+                for k, v in self._formatters.iteritems()]
 
         # normalize sortby list -- if sort item is string, assume we want 
         #   ascending sort, otherwise, use supplied sort direction
-        self.sortby = [
+        self._sortby = [
                 (idx(k), 'asc') if isinstance(k, str) else (idx(k[0]), k[1]) 
                 for k in self.sortby]
 
+        # window columns are computed from rows already in display order 
+        #   (see _window_rows)
+        self._windowfunctions = [(idx(k), idx(f.column), f)
+                for k, f in self.windowcolumns.iteritems()]
+        for i, direction in self._sortby:
+            if i >= len(self._datacolumns):
+                raise ValueError("Can not sort on window column '%s'" 
+                        % self._allcolumns[i])
+
+        # display window (offset, limit) of each group level, followed by 
+        #   the detail level
+        levels = len(self.groupby) + 1
+        self._windows = zip(level_settings(self.offset, levels, 0), 
+                level_settings(self.limit, levels, None))
+
         # make sure we have display columns
-        if not len(self.columns): 
-            self.columns = self._allcolumns
+        self._columns = self.columns or self._allcolumns
 
         # materialize display column into numerical indexes
         if len(self._allcolumns):
             self._displaycolumns = []
             try:
-                for column in self.columns:
+                for column in self._columns:
                     self._displaycolumns.append(self._allcolumns.index(column))
             except ValueError:
                 raise ColumnDoesNotExistError(column)
         else:
             self._allcolumns = self._displaycolumns = range(len(self.data[0]))
+            self._columns = self.columns or self._allcolumns
+
+        # compile filter and style criteria once, rather than once per row.
+        #   Filters see raw columns only; columnar filters read straight from
+        #   the store's column vectors
+        try:
+            if self.columnar:
+                self._filters = [self._column_predicate(f) 
+                        for f in self.filters]
+            else:
+                self._filters = [predicate(f, self._rawcolumns) 
+                        for f in self.filters]
+            self._post_aggregate_filters = [predicate(f, self._allcolumns) 
+                    for f in self.post_aggregate_filters]
+            self._rowstyles = [(predicate(d, self._allcolumns), s) 
+                    for d, s in self.rowstyles]
+            self._cellstyles = [(self._allcolumns.index(c), 
+                    predicate(d, self._allcolumns), s) 
+                    for c, d, s in self.cellstyles]
+
+            # formula strings are ordered by dependency and compiled into a
+            #   single pass; callables can not be inspected, so they are 
+            #   resolved row by row (see calculatevalues)
+            if all(isinstance(v, str) 
+                    for v in self.calculatedcolumns.itervalues()):
+                self._calculate = compile_calculations(
+                        self.calculatedcolumns, self._datacolumns)
+            else:
+                self._calculate = None
+        except KeyError, e:
+            raise ColumnDoesNotExistError(e.args[0])
+
+        # base style of each cell comes from its column style
+        self._columnstyles = ['' for x in self._allcolumns]
+        for c, s in self.columnstyles:
+            self._columnstyles[self._allcolumns.index(c)] = s
+
+
+    def _compile_groups(self, groups, groupby, aggregate_row=None):
+        """Compile one level of a group tree into a list of ResultGroups, in
+        display order"""
+        output = self._window_groups(
+                self._group_rows(groups, groupby, aggregate_row), groupby)
+        return [self._compile_group(entry, groupby) for entry in output]
+
+
+    def _group_rows(self, groups, groupby, aggregate_row=None):
+        """Return (value, aggregate row data, level, formatted value, group
+        node) of each group at one level of a group tree that passes the post
+        aggregate filters"""
+        groupby_len = len(groupby)
 
+        # get unique values for aggregation requested
+        idx = self._allcolumns.index(groupby[0])
+
+        # compile aggregate row for each group
+        output = []
+        for value, node in groups.iteritems():
+            # format aggregate value (nulls are blank)
+            if value is NULL:
+                fvalue = ''
+            elif idx in self._formatters:
+                fvalue = self._formatters[idx](value)
+            else:
+                fvalue = value
+
+            # if details are suppressed, decrement out agg-level
+            level = groupby_len - 1 if self.suppressdetail else groupby_len
+           
+            # build aggregate summary row
+            rowdata = self._compile_aggregate_data(node.state, aggregate_row)
+            rowdata[idx] = value
+
+            # add calculated columns to data
+            rowdata = self._add_calculated_columns(rowdata)
+
+            # Do post aggregate filters
+            if any(self._post_filter(row) for row in self._rows(node.items)):
+                output.append((value, rowdata, level, fvalue, node))
+        return output
+
+
+    def _window_groups(self, output, groupby):
+        """Order groups (see _group_rows) by aggregate row sorting, then by
+        value, keeping only the groups within their level's display window"""
+        offset, limit = self._windows[len(self.groupby) - len(groupby)]
+        return sorted_window(output, self._sortby + [(None, 'asc')], 
+                offset, limit, lambda c, d: d[0] if c is None else d[1][c])
+
+
+    def _compile_group(self, entry, groupby):
+        """Compile group (see _group_rows) into a ResultGroup: its aggregate
+        row, along with the rows beneath its aggregation level"""
+        value, rowdata, level, fvalue, node = entry
+        if not level:
+            children = ()
+        elif node.children:
+            children = self._compile_groups(node.children, groupby[1:], 
+                    rowdata)
+        else:
+            children = self._compile_rows(node.items, rowdata)
+        row = self._result_row(rowdata, level, groupby[0], fvalue)
+        return ResultGroup(row, tuple(children))
+
+
+    def _compile_parallel(self):
+        """Compile the groups of (filtered) row data across a process pool,
+        returning (first-level ResultGroups, aggregate states of the data)"""
+        global _pool_work
+        idx = self._allcolumns.index(self.groupby[0])
+        partitions = [[] for i in xrange(self.parallel)]
+        for row in self.data:
+            partitions[hash(row[idx]) % self.parallel].append(row)
+
+        # workers are forked with the grid and partitions in place, so only
+        #   partition numbers and compiled results cross process boundaries
+        _pool_work = (self, partitions)
+        pool = multiprocessing.Pool(self.parallel)
+        try:
+            results = pool.map(_compile_partition, range(self.parallel))
+        finally:
+            pool.terminate()
+            _pool_work = None
+
+        totals = dict((i, acc.init()) 
+                for i, acc in self._accumulators.iteritems())
+        output = []
+        for groups, states in results:
+            output.extend(groups)
+            for i, acc in self._accumulators.iteritems():
+                totals[i] = acc.merge(totals[i], states[i])
+        body = [group for value, rowdata, level, fvalue, group in 
+                self._window_groups(output, self.groupby)]
+        return body, totals
+
+
+    def _compile_partition(self, data):
+        """Filter, group, aggregate and compile a partition of row data 
+        (see _compile_parallel), returning the (value, aggregate row data, 
+        level, formatted value, ResultGroup) of each of its first-level 
+        groups and the partition's aggregate states"""
+        for f in self._filters:
+            data = [row for row in data if f(row)]
+        groups = self._group_tree(data, self.groupby)
+        states = self._aggregate(groups)
+        return [entry[:4] + (self._compile_group(entry, self.groupby),) 
+                for entry in self._group_rows(groups, self.groupby)], states
+
+
+    def _compile_sets(self, data, sets):
+        """Compile each of the grouping sets of data into a section of
+        datagrid.result.CompiledSets, in a single pass over the data"""
+        columns = []
+        for groupset in sets:
+            columns.extend(c for c in groupset if c not in columns)
+
+        if columns:
+            tree = self._group_tree(data, columns)
+            totals = self._aggregate(tree)
+            leaves = [(key, node, any(self._post_filter(row) 
+                    for row in self._rows(node.items)))
+                    for key, node in group_leaves(tree)]
+        else:
+            totals = self._accumulate(data)
+            leaves = []
 
-    def _render_body(self, data, groupby=list(), aggregate_row=None):
-        """Render table body segment
+        tail = self._total_row(totals)
+        sections = [self._compile_set(groupset, columns, leaves, tail) 
+                for groupset in sets]
+        return CompiledSets(sets, sections, tail)
 
-        For flat data sets (unaggregated), this includes the entire body of
-        data.  Aggregated sets, however, will call _render_body for each 
-        aggregation name/value pair."""
-        groupby_len = len(groupby)
 
-        if groupby_len:
-            # get unique values for aggregation requested
-            idx = self._allcolumns.index(groupby[0])
-
-            # create method to group by
-            keyfunc = lambda x: x[idx]
-
-            # group data into chunks of aggregated data
-            output = []
-            data = sorted(data, key=keyfunc)
-            for value, subdata in itertools.groupby(data, keyfunc):
-               
-                # we will be looking at this more than once, so we need a 
-                #   concrete list (tuple), not just an iterator
-                subdata = tuple(subdata)
-
-                # format aggregate value
-                if idx in self.formatters:
-                    fvalue = self.formatters[idx](value)
-                else:
-                    fvalue = value
-
-                # this config gets sent to renderer.row for displaying 
-                #   aggregate row information (name, value, etc)
-                rowargs = dict(name=groupby[0], value=fvalue, level=groupby_len)
-               
-                # build aggregate summary row
-                rowdata = self._compile_aggregate_data(subdata, aggregate_row)
-                rowdata[idx] = value
-
-                # add calculated columns to data
-                rowdata = self._add_calculated_columns(rowdata)
-
-                # if details are suppressed, decrement out agg-level
-                if self.suppressdetail: 
-                    rowargs['level'] -= 1
-
-                # Do post aggregate filters
-                def fun(row):
-                    formatted_row = dict(zip(self._rawcolumns, row))
-                    for f in self.post_aggregate_filters:
-                        if not bool_formula(f)(formatted_row):
-                            return False
-                    return True
-
-                if any(map(fun, subdata)):
-                    # generate aggregate row
-                    rowoutput = self._render_row(rowdata, **rowargs)
-
-                    # render remainder of rows beneath aggregation level
-                    if rowargs['level'] > 0:
-                        rowoutput += self._render_body(subdata, groupby[1:], 
-                                rowdata)
-
-                    # append rendered data to output buffer
-                    output.append((rowdata, rowoutput))
-
-            # sort aggregate row sorting and return compiled string
-            output = multi_sorted(output, self.sortby, lambda c, d: d[0][c])
-            return ''.join(row[1] for row in output)
-        else:
-            # Find calculated column values and apply formatting for given row
-            data = [self._add_calculated_columns(row) for row in data]
+    def _compile_set(self, groupset, columns, leaves, tail):
+        """Compile the aggregate rows of a grouping set from the finest
+        groups (see _compile_sets) into a CompiledGrid"""
+        positions = [columns.index(c) for c in groupset]
+        indexes = [self._allcolumns.index(c) for c in groupset]
 
-            if self.post_aggregate_filters:
-                for f in self.post_aggregate_filters:
-                    data = [r for r in data if bool_formula(f)(
-                        dict(zip(self._allcolumns, r)))]
+        # merge the states of the finest groups within each group of the set
+        states, visible = {}, {}
+        for key, node, passes in (leaves if groupset else ()):
+            key = tuple(key[p] for p in positions)
+            try:
+                state = states[key]
+            except KeyError:
+                state = states[key] = dict((i, acc.init()) 
+                        for i, acc in self._accumulators.iteritems())
+                visible[key] = False
+            for i, acc in self._accumulators.iteritems():
+                state[i] = acc.merge(state[i], node.state[i])
+            visible[key] = visible[key] or passes
+
+        output = []
+        for key, state in states.iteritems():
+            if visible[key]:
+                rowdata = self._compile_aggregate_data(state)
+                for i, value in zip(indexes, key):
+                    rowdata[i] = value
+                output.append((key, self._add_calculated_columns(rowdata)))
+
+        # order groups by aggregate row sorting, then by value
+        offset, limit = self._windows[0]
+        output = sorted_window(output, self._sortby + [(None, 'asc')], 
+                offset, limit, lambda c, d: d[0] if c is None else d[1][c])
+        body = self._result_rows([rowdata for key, rowdata in output])
+        return CompiledGrid(self._columns, self._allcolumns, self.labels,
+                self.descriptions, (), False, body, tail)
+
+
+    def _compile_pivot(self):
+        """Compile pivot table (see pivot) into a CompiledGrid, from a sparse
+        map of cell aggregate states (see datagrid.datatools.pivot_cells)"""
+        if self.groupby or grouping_sets(self.groupingsets, self.rollup, 
+                self.cube):
+            raise ValueError('groupby can not be combined with pivot')
+        rowkeys, columnkey, value, method = self.pivot
+
+        # the data is filtered and calculated with the grid's own settings,
+        #   left free of the settings that apply to the pivot table
+        source = copy(self)
+        source.aggregate = {}
+        source.sortby = source.columns = []
+        source.formatters = {}
+        source.rowstyles = source.cellstyles = source.columnstyles = []
+        source.post_aggregate_filters = []
+        source.windowcolumns = {}
+        source._normalize()
+        data = source._rows(source._filter_data())
+        if source.calculatedcolumns:
+            data = itertools.imap(source._add_calculated_columns, data)
+
+        try:
+            keys = [source._allcolumns.index(c) for c in rowkeys]
+            column = source._allcolumns.index(columnkey)
+            index = source._allcolumns.index(value)
+        except ValueError:
+            missing = [c for c in itertools.chain(rowkeys, [columnkey, value])
+                    if c not in source._allcolumns]
+            raise ColumnDoesNotExistError(missing[0])
+
+        acc = accumulator(method)
+        cells, columns = pivot_cells(data, 
+                lambda row: tuple(row[i] for i in keys), itemgetter(column), 
+                itemgetter(index), acc)
+        columns = sorted(columns)
+        names = [str(_cell(c)) for c in columns]
+        rows = [list(key) + [acc.finalize(row[c]) if c in row else '' 
+                for c in columns] for key, row in sorted(cells.iteritems())]
+
+        # grand totals merge the states of each generated column's cells
+        totals = [''] * len(keys)
+        for c in columns:
+            states = [row[c] for row in cells.itervalues() if c in row]
+            if states:
+                totals.append(acc.finalize(reduce(acc.merge, states, 
+                        acc.init())))
+            else:
+                totals.append('')
+
+        # the pivot table is compiled as a flat grid, display settings of 
+        #   the value column applying to the generated columns
+        labels = list(rowkeys) + names
+        formatters = dict.fromkeys(names, self.formatters[value]) \
+                if value in self.formatters else {}
+        formatters.update((k, v) for k, v in self.formatters.iteritems() 
+                if k in labels)
+        columnstyles = [(n, s) for c, s in self.columnstyles if c == value 
+                for n in names] 
+        columnstyles.extend((c, s) for c, s in self.columnstyles 
+                if c in labels)
+
+        grid = copy(self)
+        grid.data = rows
+        grid.labels = labels
+        grid.pivot = None
+        grid.aggregate = {}
+        grid.calculatedcolumns = {}
+        grid.filters = []
+        grid.formatters = formatters
+        grid.columnstyles = columnstyles
+        grid.columnar = False
+        grid.backend = 'python'
+        grid.sortmemory = grid.parallel = None
+        grid._compiled = None
+        result = grid.compile()
+        return CompiledGrid(result.columns, result.allcolumns, labels, 
+                self.descriptions, (), False, result.body, 
+                grid._result_row(totals))
+
+
+    def _compile_rows(self, data, total=None):
+        """Compile (ungrouped) data into a list of detail ResultRows, total
+        being the aggregate row data of data (or a function returning it)
+        """
+        # Find calculated column values for given row
+        data = self._detail_rows(data)
+
+        # sort data, keeping only the rows within the display window
+        return self._result_rows(self._sorted_rows(data, total))
+
+
+    def _stream_rows(self, data, totals):
+        """Compile a stream of (ungrouped) rows into detail rows, sorted
+        externally within the memory budget"""
+        rows = itertools.imap(self._add_calculated_columns, data)
+        windowed = bool(self._windowfunctions)
+        # rows are compiled with the settings of this compile (a shallow 
+        #   copy of the grid keeps them if the grid is compiled again)
+        grid = copy(self)
+        total = lambda: grid._add_calculated_columns(
+                grid._compile_aggregate_data(totals))
+
+        offset, limit = self._windows[-1]
+        if not self._external():
+            if self._sortby or any(f.needs_total 
+                    for i, c, f in self._windowfunctions):
+                return self._result_rows(self._sorted_rows(list(rows), 
+                        total))
+            if windowed:
+                rows = grid._window_rows(rows, total)
+            elif self._post_aggregate_filters:
+                rows = itertools.ifilter(self._post_filter, rows)
+            return ResultStream(rows, grid._result_rows, offset, limit)
+
+        if self._post_aggregate_filters and not windowed:
+            rows = itertools.ifilter(self._post_filter, rows)
+        if limit is not None and not windowed:
+            return self._result_rows(extsort.sorted_window(rows, 
+                    self._sortby, offset, limit))
+
+        rows = extsort.external_sorted(rows, self._sortby, 
+                memory=self.sortmemory)
+        if windowed:
+            rows = MappedRows(rows, lambda rows: grid._window_rows(rows, 
+                    total))
+        return ResultStream(rows, grid._result_rows, offset, limit)
+
+
+    def _sorted_rows(self, data, total=None):
+        """Return list of the detail rows of data within the display window,
+        sorted, post filtered and with window columns (see _window_rows)"""
+        offset, limit = self._windows[-1]
+        if not self._windowfunctions:
+            if self._post_aggregate_filters:
+                data = [r for r in data if self._post_filter(r)]
+            return sorted_window(data, self._sortby, offset, limit)
+
+        # window columns see every row of the partition, in display order
+        rows = self._window_rows(sorted_window(data, self._sortby), total)
+        stop = None if limit is None else offset + limit
+        return list(itertools.islice(rows, offset, stop))
+
+
+    def _window_rows(self, rows, total=None):
+        """Generate rows (detail rows of a partition, in display order) with
+        their window column values, then post filter them"""
+        functions = self._windowfunctions
+        if any(f.needs_total for i, c, f in functions):
+            if callable(total):
+                total = total()
+            states = [(i, c, f, f.init(total[c] if f.needs_total else None))
+                    for i, c, f in functions]
+        else:
+            states = [(i, c, f, f.init(None)) for i, c, f in functions]
 
-            # sort data and display
-            data = multi_sorted(data, self.sortby)
-            return ''.join(self._render_row(row) for row in data)
-    
+        post_filter = self._post_filter
+        for row in rows:
+            for i, c, f, state in states:
+                row[i] = f.step(state, row[c])
+            if post_filter(row):
+                yield row
 
-    def _render_cells(self, data):
-        """Render cell-block using given data"""
 
-        cell_styles = ['' for x in self._allcolumns]
+    def _result_row(self, data, level=0, name=None, value=None, 
+            values=None):
+        """Style and format row of data (unless given its formatted 
+        values), returning a ResultRow"""
+        # Style rows
+        style = ' '.join(s for f, s in self._rowstyles if f(data))
 
         # Style column
-        if self.columnstyles:
-            for c, s in self.columnstyles:
-                cell_styles[self._allcolumns.index(c)] = s
+        cell_styles = list(self._columnstyles)
 
         # Style cells
-        if self.cellstyles:
-            for c, d, s in self.cellstyles:
-                f = bool_formula(d)
-                if f(dict(zip(self._allcolumns, data))):
-                    cell_styles[self._allcolumns.index(c)] += s
+        for c, f, s in self._cellstyles:
+            if f(data):
+                cell_styles[c] += s
 
         # formatted columns
-        if self.formatters:
-            data = list(data)
-            for column, formatter in self.formatters.iteritems():
-                if data[column] != '': 
-                    data[column] = formatter(data[column])
+        if values is None:
+            values = data
+            if self._formatters:
+                values = list(data)
+                for column, formatter in self._formatters.iteritems():
+                    if values[column] not in EMPTY: 
+                        values[column] = formatter(values[column])
+
+        cells = tuple((cell_styles[k], _cell(values[k])) 
+                for k in self._displaycolumns)
+        return ResultRow(tuple(data), style, cells, level, name, value)
+
+
+    def _result_rows(self, rows):
+        """Style and format detail rows, column by column"""
+        values = rows
+        if self._formatters:
+            values = [list(row) for row in rows]
+            for column, batch in self._batchformatters:
+                # empty values are not formatted
+                filled = [v for v in values if v[column] not in EMPTY]
+                for v, fvalue in itertools.izip(filled, 
+                        batch([v[column] for v in filled])):
+                    v[column] = fvalue
+
+        if self._rowstyles or self._cellstyles:
+            return [self._result_row(row, values=v) 
+                    for row, v in itertools.izip(rows, values)]
+
+        # without row or cell styles, every row has the column styles
+        display = self._displaycolumns
+        styles = [self._columnstyles[k] for k in display]
+        return [ResultRow(tuple(row), '', 
+                tuple(zip(styles, [_cell(v[k]) for k in display])), 0, 
+                None, None)
+                for row, v in itertools.izip(rows, values)]
+
+
+    def _total_row(self, states):
+        """Return grand total ResultRow for the aggregate states of the data
+        """
+        return self._result_row(self._add_calculated_columns(
+                self._compile_aggregate_data(states)))
 
-        # Return block of rendered cells (use renderer.cell for actual 
-        #   rendering)
-        return ''.join(self.renderer.cell(self, cell_styles[k], data[k], i) 
-                for i, k in enumerate(self._displaycolumns))
 
+    def _add_calculated_columns(self, row):
+        """Add Calculated Columns to row of data (leaving any window columns
+        empty)."""
+        if self._calculate is not None:
+            row = self._calculate(row)
+        else:
+            row = calculatevalues(
+                    dict(zip(self._rawcolumns, row)), 
+                    self._calculatedcolumns)
+            row = [row[k] for k in self._datacolumns]
 
-    def _render_row(self, data, **kargs):
-        """Render table-row"""
-        row_styles = []
+        if self._windowfunctions:
+            row.extend([''] * len(self._windowfunctions))
+        return row
 
-        # Style rows
-        if self.rowstyles:
-            for d, s in self.rowstyles:
-                f = bool_formula(d)
-                if f(dict(zip(self._allcolumns, data))):
-                    row_styles.append(s)
 
-        return self.renderer.row(self, ' '.join(row_styles), self._render_cells(data), **kargs)
+    def _compile_aggregate_data(self, states, rowmodel=None):
+        """Generate aggregate row summary data from partial aggregate states
+        (see _aggregate)"""
+        # prepopulate with empty data (copy model row, it may still be in 
+        #   use by the caller)
+        rowdata = list(rowmodel) if rowmodel else [''] * len(self._allcolumns)
+
+        # generate aggregate-row values
+        for i, acc in self._accumulators.iteritems():
+            rowdata[i] = acc.finalize(states[i])
+        return rowdata
 
 
-    def _add_calculated_columns(self, row):
-        """Add Calculated Columns to row of data."""
-        row = calculatevalues(
-                dict(zip(self._rawcolumns, row)), 
-                self._calculatedcolumns)
-        return [row[k] for k in self._allcolumns]
+    def _aggregate(self, groups):
+        """Set the partial aggregate states of every group in a group tree,
+        returning the combined states of the whole tree"""
+        total = dict((i, acc.init()) 
+                for i, acc in self._accumulators.iteritems())
+        for node in groups.itervalues():
+            if node.children:
+                node.state = self._aggregate(node.children)
+            else:
+                node.state = self._accumulate(node.items)
+
+            # merge into a new state, the child's is still needed
+            for i, acc in self._accumulators.iteritems():
+                total[i] = acc.merge(total[i], node.state[i])
+        return total
+
+
+    def _accumulate(self, data):
+        """Return partial aggregate states (by column index) of data"""
+        if self.backend == 'numpy':
+            return dict((i, self.data.accumulate(i, acc, data))
+                    for i, acc in self._accumulators.iteritems())
+
+        states = {}
+        if self._accumulators:
+            column_values = self._column_values(data)
+            for i, acc in self._accumulators.iteritems():
+                states[i] = acc.update(acc.init(), 
+                        [v for v in column_values(i) if v not in EMPTY])
+        return states
+
+
+    def _accumulating(self, rows, states, size=1024):
+        """Generate rows, merging the partial aggregate states of each chunk
+        of rows into states as they pass."""
+        rows = iter(rows)
+        for chunk in iter(lambda: list(itertools.islice(rows, size)), []):
+            for i, state in self._accumulate(chunk).iteritems():
+                states[i] = self._accumulators[i].merge(states[i], state)
+            for row in chunk:
+                yield row
+
+
+    def _load(self, data):
+        """Return data held in the storage chosen for this grid (row lists as
+        given, iterators as a datagrid.datatools.RowStream)"""
+        if self.backend == 'numpy':
+            return data if isinstance(data, NumpyStore) else NumpyStore(data)
+        if self.columnar:
+            return data if isinstance(data, ColumnStore) else ColumnStore(data)
+        if self._external():
+            if isinstance(data, extsort.Spool):
+                return data
+            return extsort.Spool(data, self.sortmemory)
+        if isinstance(data, (list, RowStream)):
+            return data
+        if iter(data) is data:
+            return RowStream(data)
+        return list(data)
+
+
+    def _external(self):
+        """Return whether row data is held within a memory budget (see 
+        sortmemory)."""
+        return self.sortmemory is not None and not self.columnar
+
+
+    def _parallel(self):
+        """Return whether groups are compiled across a process pool (see 
+        parallel)."""
+        return self.parallel > 1 and bool(self.groupby) \
+                and not self.columnar and not self._external()
+
+
+    def _streamed(self):
+        """Return whether row data is a one-pass stream (see 
+        datagrid.datatools.RowStream)."""
+        return isinstance(self.data, RowStream)
+
+
+    def _filter_data(self):
+        """Apply filters and return the data to be rendered (a selection of row
+        indexes for columnar data)"""
+        if self.columnar:
+            data = self.data.selection()
+            for f in self._filters:
+                data = self.data.filter(f, data)
+            return data
+
+        data = self.data
+        for f in self._filters:
+            if self._external() or self._streamed():
+                data = itertools.ifilter(f, data)
+            else:
+                data = [row for row in data if f(row)]
+        return data
+
+
+    def _column_predicate(self, criteria):
+        """Return filter criteria as a function of columnar row index."""
+        if isinstance(criteria, str):
+            return compile_column_formula(criteria, self._rawcolumns, 
+                    self.data.columns, numeric=False)
+        f = predicate(criteria, self._rawcolumns)
+        return lambda i: f(self.data[i])
+
+
+    def _post_filter(self, row):
+        """Return whether row passes all post aggregate filters."""
+        for f in self._post_aggregate_filters:
+            if not f(row):
+                return False
+        return True
+
+
+    def _group_tree(self, data, groupby):
+        """Partition data into a group tree on the groupby columns (see 
+        datagrid.datatools.group_tree)"""
+        columns = [self._allcolumns.index(c) for c in groupby]
+        if self.columnar:
+            return self.data.group_tree(columns, data)
+        return group_tree(data, [itemgetter(i) for i in columns])
+
+
+    def _detail_rows(self, data):
+        """Return list of the rows in data, with calculated columns."""
+        if self._calculatedvectors is not None:
+            rows = list(self.data.rows(data, self._calculatedvectors))
+            if self._windowfunctions:
+                for row in rows:
+                    row.extend([''] * len(self._windowfunctions))
+            return rows
+        return [self._add_calculated_columns(row) for row in self._rows(data)]
+
+
+    def _rows(self, data):
+        """Return iterable of raw row lists in data."""
+        if self.columnar:
+            return self.data.rows(data)
+        return data
+
+
+    def _column_values(self, data):
+        """Return method providing the list of values of a raw column (by 
+        index) across data."""
+        if self.columnar:
+            return lambda i: self.data.take(i, data)
+        if not data:
+            return lambda i: []
+        return zip(*data).__getitem__
+
+
+# Grid and data partitions of the parallel compile in progress (inherited 
+#   by forked pool workers, see DataGrid._compile_parallel)
+_pool_work = None
 
 
-    def _compile_aggregate_data(self, data, rowmodel=None):
-        """Generate aggregate row summary data"""
-        # prepopulate with empty data
-        rowdata = rowmodel or [''] * len(self._allcolumns)
+def _compile_partition(i):
+    """Compile the groups of data partition i in a pool worker"""
+    grid, partitions = _pool_work
+    return grid._compile_partition(partitions[i])
 
-        # generate aggregate-row values
-        if len(self.aggregate):
-            column_values = zip(*data)
-            for i, method in self.aggregate.iteritems():
-                rowdata[i] = method([v 
-                    for v in column_values[i] if v != ''])
-        return rowdata
+
+def predicate(criteria, columns):
+    """Return filter/style criteria (an expression string, or a callable of a
+    column name to value mapping) as a function of a row sequence
+
+    Example:
+    >>> predicate('{b} > 1', ['a', 'b'])([3, 2])
+    True
+    >>> predicate(lambda d: d['a'] > 1, ['a', 'b'])([1, 2])
+    False
+    """
+    if isinstance(criteria, str):
+        return compile_formula(criteria, columns, numeric=False)
+    return lambda row: criteria(dict(zip(columns, row)))
+
+
+def grouping_sets(groupingsets=None, rollup=None, cube=None):
+    """Return list of the grouping sets (tuples of column names) given 
+    explicitly, as a rollup (each leading subset of columns, longest first)
+    and as a cube (every subset), without repeats
+
+    Example:
+    >>> grouping_sets(rollup=['a', 'b'])
+    [('a', 'b'), ('a',), ()]
+    >>> grouping_sets(cube=['a', 'b'])
+    [('a', 'b'), ('a',), ('b',), ()]
+    >>> grouping_sets([['b'], []], rollup=['a'])
+    [('b',), (), ('a',)]
+    """
+    sets = [tuple(s) for s in groupingsets or []]
+    if rollup:
+        sets.extend(tuple(rollup[:n]) for n in xrange(len(rollup), -1, -1))
+    if cube:
+        for n in xrange(len(cube), -1, -1):
+            sets.extend(itertools.combinations(cube, n))
+
+    unique = []
+    for groupset in sets:
+        if groupset not in unique:
+            unique.append(groupset)
+    return unique
+
+
+def level_settings(value, levels, default):
+    """Return per-level list of a setting given either for the top level 
+    only (single value) or as a list of values by level
+
+    Example:
+    >>> level_settings(5, 3, None)
+    [5, None, None]
+    >>> level_settings([1, 2], 3, 0)
+    [1, 2, 0]
+    >>> level_settings(None, 2, 0)
+    [0, 0]
+    """
+    if value is None:
+        value = []
+    elif not isinstance(value, (list, tuple)):
+        value = [value]
+    values = itertools.chain(value, itertools.repeat(None))
+    return [default if v is None else v 
+            for v in itertools.islice(values, levels)]
+
+
+def _cell(value):
+    """Return value as displayed in a cell (nulls are blank)
+
+    Example:
+    >>> _cell(None), _cell(0)
+    ('', 0)
+    """
+    return '' if value is NULL else value
 
 
 def generate_column_names(width, columns=None):
@@ -18,10 +18,21 @@
 
 """Data handling and manipulation tools"""
 
-from functools import partial
-from itertools import ifilter
+import heapq
+import random
+from itertools import chain, ifilter, imap, islice, izip
+from operator import itemgetter
 from abc import ABCMeta
 
+from datagrid.calctools import compile_formula, formula_references
+from datagrid.typetools import NULL, NULLS, EMPTY, interned, \
+        row_converter, salvage_row
+
+
+# Number of rows column types are guessed from (see sample_rows and 
+#   reservoir_sample)
+TYPE_SAMPLE = 1000
+
 
 class TypeOrValueError(Exception):
     """Meta exception including both TypeError and ValueError exceptions"""
@@ -48,25 +59,330 @@ def multi_sorted(data, sortcolumns, key=None):
     >>> list(multi_sorted(data, [[0,'desc']]))
     [[4, 5, 6], [1, 2, 3]]
     """
+    if not sortcolumns:
+        return data
+    data = list(data)
+    keys = sort_keys(data, sortcolumns, key)
+    return [data[i] for i in sorted(xrange(len(data)), key=keys.__getitem__)]
+
+
+# Types whose sort order can be reversed by negation
+NUMBERS = frozenset([int, long, float, bool])
+
+
+class Descending(object):
+    """Sort key wrapper reversing the order of the wrapped key (and comparing
+    against negated numbers as the key would against the number)
+
+    Example:
+    >>> sorted(['a', 'c', 'b'], key=Descending)
+    ['c', 'b', 'a']
+    >>> [k if k.__class__ is int else k.key for k in 
+    ...         sorted([-2, Descending('a'), -1])]
+    ['a', -2, -1]
+    """
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return _original(other) < self.key
+
+    def __gt__(self, other):
+        return _original(other) > self.key
+
+    def __le__(self, other):
+        return _original(other) <= self.key
+
+    def __ge__(self, other):
+        return _original(other) >= self.key
+
+    def __eq__(self, other):
+        return self.key == _original(other)
 
-    # Default key function if none is given
-    if key is None: 
-        key = lambda column, data: \
-                str.lower(data[column]) \
-                if isinstance(data[column], str) else data[column]
+    def __ne__(self, other):
+        return self.key != _original(other)
 
-    # Apply sorted iterator for each given sort column/direction
-    for column, direction in reversed(sortcolumns):
-        # Apply Sort
-        data = sorted(data, key=partial(key, column), 
-                reverse=(direction == 'desc'))
 
-    # Return sorting iterator
-    return data
+def _original(key):
+    """Return the key a descending sort key was made from"""
+    if isinstance(key, Descending):
+        return key.key
+    return -key
 
 
-def set_column_types(data, types):
-    """Map types to columns on give data (generator) 
+def sort_keys(data, sortcolumns, key=None):
+    """Return list of composite sort keys (one per row of data) for sorting
+    on sortcolumns in a single pass
+
+    Params:
+        - data: list of rows
+        - sortcolumns: list of columns and directions (see multi_sorted)
+        - key: sort key func, receiving column and row (default: the row's
+            value for the column)
+
+    Example:
+    >>> data = [['b', 1], ['A', 2], ['a', 1]]
+    >>> sort_keys(data, [(0, 'asc'), (1, 'desc')])
+    [(1, -1), (0, -2), (0, -1)]
+    >>> sort_keys(data, [(0, 'desc')])
+    [0, 1, 1]
+    """
+    columns = []
+    for column, direction in sortcolumns:
+        if key is None:
+            values = map(itemgetter(column), data)
+        else:
+            values = [key(column, row) for row in data]
+        keys, width = _column_keys(values, direction == 'desc', key is None)
+
+        # adjoining ranked columns combine into a single integer key
+        if width and columns and columns[-1][1]:
+            previous = columns.pop()[0]
+            keys = [p * width + k for p, k in izip(previous, keys)]
+        columns.append((keys, width))
+
+    if len(columns) == 1:
+        return columns[0][0]
+    return zip(*[keys for keys, width in columns])
+
+
+def collation_key(value, collate=True):
+    """Return key value sorts on: nulls collate as empty strings, and str
+    values (given collate) in lower case
+
+    Example:
+    >>> collation_key('Abc'), collation_key(None), collation_key(1.5)
+    ('abc', '', 1.5)
+    """
+    if value is NULL:
+        return ''
+    return value.lower() if collate and type(value) is str else value
+
+
+def _column_keys(values, descending, collate):
+    """Return sort keys for a single column of values (see sort_keys), and
+    the number of ranks when the keys are ranks (None otherwise)"""
+    if set(map(type, values)) <= NUMBERS:
+        return ([-v for v in values] if descending else values), None
+
+    lower = lambda value: collation_key(value, collate)
+    try:
+        distinct = dict((v, lower(v)) for v in set(values))
+    except TypeError:   # unhashable values
+        if descending:
+            return [Descending(lower(v)) for v in values], None
+        return map(lower, values), None
+
+    # rank collation keys; equal keys share a rank
+    ranks = dict((k, i) for i, k in enumerate(sorted(set(
+            distinct.itervalues()), reverse=descending)))
+    rank = dict((v, ranks[k]) for v, k in distinct.iteritems())
+    return map(rank.__getitem__, values), len(ranks)
+
+
+def sorted_window(data, sortcolumns, offset=0, limit=None, key=None):
+    """Return rows offset through offset + limit of data, in the order given
+    by multi_sorted (same parameters)
+
+    Example:
+    >>> data = [[3, 'a'], [1, 'b'], [2, 'c'], [1, 'd']]
+    >>> sorted_window(data, [[0, 'desc']], 1, 2)
+    [[2, 'c'], [1, 'b']]
+    >>> sorted_window(data, [], 3)
+    [[1, 'd']]
+    """
+    if limit is None:
+        return list(multi_sorted(data, sortcolumns, key))[offset:]
+    if not sortcolumns:
+        return list(islice(data, offset, offset + limit))
+
+    data = list(data)
+    keys = sort_keys(data, sortcolumns, key)
+    window = heapq.nsmallest(offset + limit, xrange(len(data)), 
+            key=keys.__getitem__)[offset:]
+    return [data[i] for i in window]
+
+
+class GroupNode(object):
+    """Group of items within a group tree (see group_tree)
+
+    items: every item belonging to the group
+    children: dictionary of sub-groups (by key), empty at the deepest level
+    state: partial aggregate states of the group (see datagrid.accumulate)
+    """
+    __slots__ = ('items', 'children', 'state')
+
+    def __init__(self, items):
+        self.items = items
+        self.children = {}
+        self.state = None
+
+
+def group_tree(data, keys, container=list):
+    """Partition data into a tree of groups (GroupNodes by key value, one level
+    per key function) in a single pass
+
+    Params:
+        - data: iterable of items to group
+        - keys: list of key functions, one per grouping level
+        - container: factory for the collection holding each group's items
+            (must provide append)
+
+    Example:
+    >>> data = [['a', 1], ['b', 1], ['a', 2], ['a', 1]]
+    >>> tree = group_tree(data, [lambda x: x[0], lambda x: x[1]])
+    >>> sorted(tree)
+    ['a', 'b']
+    >>> tree['a'].items
+    [['a', 1], ['a', 2], ['a', 1]]
+    >>> tree['a'].children[1].items
+    [['a', 1], ['a', 1]]
+    >>> tree['b'].children[1].children
+    {}
+    """
+    tree = {}
+    for item in data:
+        groups = tree
+        for key in keys:
+            value = key(item)
+            try:
+                node = groups[value]
+            except KeyError:
+                node = groups[value] = GroupNode(container())
+            node.items.append(item)
+            groups = node.children
+    return tree
+
+
+def group_leaves(tree, key=()):
+    """Generate (key, GroupNode) for each deepest group of a group tree (see
+    group_tree), key being the tuple of the group's values at each level
+
+    Example:
+    >>> tree = group_tree([['a', 1], ['b', 1], ['a', 2]], 
+    ...         [lambda x: x[0], lambda x: x[1]])
+    >>> sorted((k, n.items) for k, n in group_leaves(tree))
+    [(('a', 1), [['a', 1]]), (('a', 2), [['a', 2]]), (('b', 1), [['b', 1]])]
+    """
+    for value, node in tree.iteritems():
+        if node.children:
+            for leaf in group_leaves(node.children, key + (value,)):
+                yield leaf
+        else:
+            yield key + (value,), node
+
+
+def pivot_cells(data, rowkey, columnkey, value, acc):
+    """Hash-aggregate data into a sparse map of the cells of a pivot table (the
+    partial states of accumulator acc), in a single pass
+
+    Params:
+        - data: iterable of items to aggregate
+        - rowkey, columnkey, value: functions of an item giving its row key,
+            column key and value
+
+    Returns (cells, columns): dictionary mapping each row key to a 
+    dictionary of cell states by column key, and the set of column keys.
+
+    Example:
+    >>> from datagrid.accumulate import Sum
+    >>> data = [['a', 'x', 1], ['a', 'y', 2], ['b', 'x', 3], ['a', 'x', 4]]
+    >>> cells, columns = pivot_cells(data, lambda x: x[0], lambda x: x[1],
+    ...         lambda x: x[2], Sum())
+    >>> sorted(cells.items()), sorted(columns)
+    ([('a', {'y': 2, 'x': 5}), ('b', {'x': 3})], ['x', 'y'])
+    """
+    cells = {}
+    columns = set()
+    for item in data:
+        column = columnkey(item)
+        columns.add(column)
+        key = rowkey(item)
+        try:
+            row = cells[key]
+        except KeyError:
+            row = cells[key] = {}
+
+        item = value(item)
+        if item not in EMPTY:
+            try:
+                row[column] = acc.step(row[column], item)
+            except KeyError:
+                row[column] = acc.step(acc.init(), item)
+    return cells, columns
+
+
+class MappedRows(object):
+    """Re-iterable sequence of rows transformed as they are read: each
+    iteration reads rows afresh through transform (a function of an
+    iterator of rows, returning an iterator)
+
+    Example:
+    >>> rows = MappedRows([[1], [2]], lambda rows: (r * 2 for r in rows))
+    >>> list(rows), list(rows)
+    ([[1, 1], [2, 2]], [[1, 1], [2, 2]])
+    """
+
+    def __init__(self, rows, transform):
+        self.rows = rows
+        self.transform = transform
+
+    def __iter__(self):
+        return self.transform(iter(self.rows))
+
+
+class RowStream(object):
+    """One-pass stream of rows, read as it is iterated (only the first row is
+    read ahead, on request)
+
+    Example:
+    >>> stream = RowStream(iter([[1, 2], [3, 4]]))
+    >>> stream[0]
+    [1, 2]
+    >>> list(stream)
+    [[1, 2], [3, 4]]
+    >>> list(stream)
+    Traceback (most recent call last):
+        ...
+    ValueError: Row stream has already been read
+    """
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.head = []
+        self.read = False
+
+    def __nonzero__(self):
+        return bool(self.read or self._peek())
+
+    def __getitem__(self, i):
+        if i != 0:
+            raise IndexError('Only the first row of a stream can be read')
+        if self.read:
+            raise ValueError('Row stream has already been read')
+        if not self._peek():
+            raise IndexError(i)
+        return self.head[0]
+
+    def __iter__(self):
+        if self.read:
+            raise ValueError('Row stream has already been read')
+        self.read = True
+        head, self.head = self.head, []
+        return chain(head, self.rows)
+
+    def _peek(self):
+        """Read the first row ahead, returning whether there is one"""
+        if not self.head and not self.read:
+            self.head = list(islice(self.rows, 1))
+        return bool(self.head)
+
+
+def set_column_types(data, types, nulls=NULLS):
+    """Map types to columns on give data (iterator), null cells (any of
+    nulls) becoming empty
 
     Example:
     >>> i = set_column_types([['1','abc','0'],['4','b','1']],(float,str,int))
@@ -75,35 +391,202 @@ def set_column_types(data, types):
     >>> i = set_column_types([['1', 'a']], (float, float))
     >>> list(i)
     [[1.0, 'a']]
+    >>> list(set_column_types([['NULL', '2']], (float, int), ['', 'NULL']))
+    [[None, 2]]
+    """
+    return imap(row_converter(types, nulls), data)
+
+
+class TypedRows(object):
+    """Iterator of rows converted to column types guessed from a sample (see
+    get_column_types), promoting a float column to str when text turns up
+
+    Example:
+    >>> rows = TypedRows([['1', 'a'], ['2.5', ''], ['n/a', 'b']], 
+    ...         [float, str], retain=True)
+    >>> list(rows)
+    [['1', 'a'], ['2.5', None], ['n/a', 'b']]
+    >>> rows.types, rows.promoted
+    ([<type 'str'>, <type 'str'>], [0])
+    """
+
+    def __init__(self, rows, types, retain=False, nulls=NULLS):
+        self.rows = iter(rows)
+        self.types = list(types)
+        self.nulls = nulls
+        self.promoted = []
+        self._read = [] if retain else None
+        self._convert = row_converter(self.types, self.nulls, self._salvage)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        """Return the next row, converted"""
+        try:
+            row = self.rows.next()
+        except StopIteration:
+            self._read = None
+            raise
+        row = self._convert(row)
+        if self._read is not None:
+            self._read.append(row)
+        return row
+
+    def _salvage(self, row):
+        """Return row converted as far as it can be (see 
+        datagrid.typetools.salvage_row), promoting the float columns it 
+        holds text in"""
+        row = salvage_row(self.types, self.nulls, row)
+        for i, t in enumerate(self.types[:len(row)]):
+            if t is float and type(row[i]) is str and _is_text(row[i]):
+                self._promote(i)
+                row[i] = interned(row[i])
+        return row
+
+    def _promote(self, i):
+        """Promote float column i to str, re-converting it in rows read, and
+        recompile the row converter"""
+        self.types[i] = str
+        self.promoted.append(i)
+        for row in self._read or ():
+            if i < len(row) and type(row[i]) is float:
+                row[i] = interned(_number_text(row[i]))
+        self._convert = row_converter(self.types, self.nulls, self._salvage)
+
+
+def _number_text(value):
+    """Return shortest text of a float (integers without a fraction)
+
+    Example:
+    >>> _number_text(12.0), _number_text(0.1)
+    ('12', '0.1')
+    """
+    if value.is_integer():
+        return '%d' % value
+    return repr(value)
+
+
+def filter_rows(data, filters, columns, types, nulls=NULLS):
+    """Return iterator of the (unconverted) rows of data passing every filter
+    expression once the columns they reference are converted to types
+    (KeyError for references to columns not found in columns)
+
+    Example:
+    >>> rows = [['a', '1'], ['b', '20'], ['c', '3']]
+    >>> list(filter_rows(rows, ['{n} > 2'], ['s', 'n'], [str, float]))
+    [['b', '20'], ['c', '3']]
     """
-    for row in data:
-        # Apply type mapping to current row and yield
-        try: 
-            yield map(lambda f, v: f(v), types, row)
+    tests = [compile_formula(f, columns, numeric=False) for f in filters]
+    conversions = [(i, types[i]) for i in filter_columns(filters, columns) 
+            if i < len(types)]
 
-        # We found a problem with the types mapping. 
-        #   attempt to salvage what we can
-        except TypeOrValueError:
-            new_row = [];
-            for i, col in enumerate(row):
+    def passes(row):
+        values = list(row)
+        for i, convert in conversions:
+            if i < len(values):
                 try:
-                    col = types[i](col)
+                    values[i] = NULL if values[i] in nulls \
+                            else convert(values[i])
                 except TypeOrValueError:
                     pass
-                except IndexError:
-                    pass
-                new_row.append(col)
-            yield new_row
+        for test in tests:
+            if not test(values):
+                return False
+        return True
+    return ifilter(passes, data)
+
+
+def filter_columns(filters, columns):
+    """Return sorted indexes of the columns referenced by filter expressions
 
+    Example:
+    >>> filter_columns(['{n} > 2', '{s} == {n}'], ['s', 'x', 'n'])
+    [0, 2]
+    """
+    return sorted(set(columns.index(name)
+            for f in filters for name in formula_references(f)))
 
-def get_column_types(columns):
-    """Determine column types from content in each column
+
+def promote_column_types(rows, types, indexes, nulls=NULLS):
+    """Return types with the float columns of indexes promoted to str when
+    any of rows holds text in them
+
+    Example:
+    >>> rows = [['1', '2'], ['a', '3'], ['b', 'c']]
+    >>> promote_column_types(rows, [float, float], [0])
+    [<type 'str'>, <type 'float'>]
+    """
+    types = list(types)
+    pending = [i for i in indexes if i < len(types) and types[i] is float]
+    for row in rows:
+        if not pending:
+            break
+        for i in pending[:]:
+            if i < len(row) and row[i] and row[i] not in nulls \
+                    and _is_text(row[i]):
+                types[i] = str
+                pending.remove(i)
+    return types
+
+
+def get_column_types(columns, nulls=NULLS):
+    """Determine column types from content in each column (null cells, any
+    of nulls, are left out)
 
     Example:
     >>> get_column_types([[1,'2',3,'a'],[2,'3','z','b']])
     [<type 'float'>, <type 'float'>, <type 'str'>, <type 'str'>]
+    >>> get_column_types(iter([['1', 'a'], ['2.5', '']]))
+    [<type 'float'>, <type 'str'>]
+    >>> get_column_types([['1'], ['NULL']], ['', 'NULL'])
+    [<type 'float'>]
     """
-    return [column_type(col) for col in zip(*columns)]
+    types = []
+    for row in columns:
+        if len(row) > len(types):
+            types.extend([float] * (len(row) - len(types)))
+        for i, value in enumerate(row):
+            if value and types[i] is float and value not in nulls \
+                    and _is_text(value):
+                types[i] = str
+    return types
+
+
+def sample_rows(rows, size=TYPE_SAMPLE):
+    """Return (the first size rows, iterator of every row), reading no more
+    rows than the sample
+
+    Example:
+    >>> sample, rows = sample_rows(iter([[1], [2], [3]]), 2)
+    >>> sample, list(rows)
+    ([[1], [2]], [[1], [2], [3]])
+    """
+    rows = iter(rows)
+    sample = list(islice(rows, size))
+    return sample, chain(sample, rows)
+
+
+def reservoir_sample(rows, size=TYPE_SAMPLE, seed=None):
+    """Return a uniform random sample of size rows (in the order read), 
+    reading every row but holding only the sample
+
+    Example:
+    >>> reservoir_sample(iter([[1], [2]]), 5)
+    [[1], [2]]
+    >>> len(reservoir_sample([[i] for i in range(100)], 10, seed=1))
+    10
+    """
+    generator = random.Random(seed)
+    sample = []
+    for i, row in enumerate(rows):
+        if i < size:
+            sample.append((i, row))
+        else:
+            j = generator.randint(0, i)
+            if j < size:
+                sample[j] = (i, row)
+    return [row for i, row in sorted(sample)]
 
 
 def column_type(values):
@@ -123,8 +606,12 @@ def column_type(values):
     """
     for value in ifilter(None, values):
         # Assume float, but wrap-up early if we find a string
-        if type(value) == str and not (
-                value.count('.') <= 1 and value.replace('.','').isdigit()):
+        if _is_text(value):
             return str
     return float
 
+
+def _is_text(value):
+    """Return whether value is a string that does not hold a number"""
+    return type(value) == str and not (
+            value.count('.') <= 1 and value.replace('.','').isdigit())
@@ -0,0 +1,230 @@
+#------------------------------------------------------------------------#
+# DataGrid - Tabular Data Rendering Library
+# Copyright (C) 2009-2010 Adam Wagner <awagner@redventures.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#------------------------------------------------------------------------#
+
+"""External (disk-backed) row storage and sorting, within a memory budget"""
+
+import cPickle
+import heapq
+import tempfile
+from itertools import count, imap, islice, izip, repeat
+from operator import itemgetter
+from sys import getsizeof
+
+from datagrid.datatools import multi_sorted, collation_key, Descending, \
+        NUMBERS
+
+
+# Default memory budget (bytes)
+DEFAULT_MEMORY = 64 * 1024 * 1024
+
+
+def row_size(row):
+    """Estimate memory held by row of values (bytes)
+
+    Example:
+    >>> row_size(['abc', 1]) > row_size(['abc'])
+    True
+    """
+    return getsizeof(row) + sum(getsizeof(value) for value in row)
+
+
+class Spool(object):
+    """Re-iterable sequence of rows, kept in memory within a memory budget
+    and spilled to a temporary file beyond it
+
+    Example:
+    >>> s = Spool([[1, 'a'], [2, 'b'], [3, 'c']], memory=0)
+    >>> len(s), s[1], list(s) == list(s)
+    (3, [2, 'b'], True)
+    """
+
+    def __init__(self, rows=(), memory=DEFAULT_MEMORY, tempdir=None):
+        self.memory = memory
+        self.tempdir = tempdir
+        self.rows = []
+        self.file = None
+        self.length = 0
+        self.size = 0
+        for row in rows:
+            self.append(row)
+
+    def append(self, row):
+        """Append row to spool"""
+        self.length += 1
+        if self.file is not None:
+            cPickle.dump(row, self.file, cPickle.HIGHEST_PROTOCOL)
+            return
+
+        self.rows.append(row)
+        self.size += row_size(row)
+        if self.size > self.memory:
+            self.spill()
+
+    def spill(self):
+        """Move rows held in memory to the spool's temporary file"""
+        if self.file is None:
+            self.file = tempfile.NamedTemporaryFile(prefix='datagrid-',
+                    dir=self.tempdir)
+        for row in self.rows:
+            cPickle.dump(row, self.file, cPickle.HIGHEST_PROTOCOL)
+        self.rows = []
+        self.size = 0
+
+    def close(self):
+        """Drop spooled rows (removing any temporary file)"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.rows = []
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.length
+        for row in islice(self, i, i + 1):
+            return row
+        raise IndexError(i)
+
+    def __iter__(self):
+        if self.file is None:
+            return iter(self.rows)
+        self.file.flush()
+        return self._read(self.file.name)
+
+    def _read(self, name):
+        """Generate rows from spool file (opened separately, so that any
+        number of iterations may run at once)"""
+        with open(name, 'rb') as spoolfile:
+            load = cPickle.load
+            for _ in xrange(self.length):
+                yield load(spoolfile)
+
+
+class SortedRows(object):
+    """Re-iterable sorted sequence of rows, merged from sorted runs on each
+    iteration (see external_sorted)"""
+
+    def __init__(self, runs, sortcolumns, key=None):
+        self.runs = runs
+        self.sortcolumns = sortcolumns
+        self.key = key
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    def __iter__(self):
+        if len(self.runs) == 1:
+            return iter(self.runs[0])
+
+        # ties are taken from earlier runs first, and in run order, so rows
+        #   themselves are never compared (and the sort is stable)
+        row_key = merge_key(self.sortcolumns, self.key)
+        runs = [izip(imap(row_key, run), repeat(i), count(), run)
+                for i, run in enumerate(self.runs)]
+        return imap(itemgetter(3), heapq.merge(*runs))
+
+    def close(self):
+        """Drop sorted runs (removing their temporary files)"""
+        for run in self.runs:
+            run.close()
+        self.runs = []
+
+
+def external_sorted(rows, sortcolumns, key=None, memory=DEFAULT_MEMORY,
+        tempdir=None):
+    """Sort rows as multi_sorted does (same sortcolumns and key), holding no
+    more than about memory bytes of rows at once
+
+    Example:
+    >>> rows = ([i % 3, 'row %s' % i] for i in xrange(6))
+    >>> list(external_sorted(rows, [(0, 'desc')], memory=200))
+    [[2, 'row 2'], [2, 'row 5'], [1, 'row 1'], [1, 'row 4'], [0, 'row 0'], [0, 'row 3']]
+    """
+    runs = []
+    run, size = [], 0
+    for row in rows:
+        run.append(row)
+        size += row_size(row)
+        if size > memory:
+            runs.append(_spill(run, sortcolumns, key, tempdir))
+            run, size = [], 0
+
+    # the last run fits the memory budget, and is kept in memory
+    if run or not runs:
+        runs.append(Spool(multi_sorted(run, sortcolumns, key), memory, 
+                tempdir))
+    return SortedRows(runs, sortcolumns, key)
+
+
+def sorted_window(rows, sortcolumns, offset=0, limit=None, key=None):
+    """Return rows offset through offset + limit of a stream of rows, in the
+    order given by multi_sorted (same sortcolumns and key), holding no more
+    than offset + limit rows at once (heapq.nsmallest)
+
+    Example:
+    >>> rows = ([i % 3, 'row %s' % i] for i in xrange(6))
+    >>> sorted_window(rows, [(0, 'desc')], 1, 2)
+    [[2, 'row 5'], [1, 'row 1']]
+    """
+    if not sortcolumns:
+        return list(islice(rows, offset, offset + limit))
+    return heapq.nsmallest(offset + limit, rows, 
+            key=merge_key(sortcolumns, key))[offset:]
+
+
+def _spill(run, sortcolumns, key, tempdir):
+    """Sort run of rows and spill it to a temporary file"""
+    spool = Spool(memory=0, tempdir=tempdir)
+    for row in multi_sorted(run, sortcolumns, key):
+        spool.append(row)
+    return spool
+
+
+def merge_key(sortcolumns, key=None):
+    """Return function of a row giving a key that orders rows as
+    multi_sorted does (for merging sorted runs)
+
+    Example:
+    >>> rows = [['b', 1], ['A', 2], ['a', 3]]
+    >>> sorted(rows, key=merge_key([(0, 'desc'), (1, 'desc')]))
+    [['b', 1], ['a', 3], ['A', 2]]
+    """
+    columns = [(column, direction == 'desc') for column, direction in
+            sortcolumns]
+
+    def column_key(column, row):
+        if key is not None:
+            return collation_key(key(column, row), False)
+        return collation_key(row[column])
+
+    def row_key(row):
+        result = []
+        for column, descending in columns:
+            value = column_key(column, row)
+            if descending:
+                if type(value) in NUMBERS:
+                    value = -value
+                else:
+                    value = Descending(value)
+            result.append(value)
+        return result
+
+    return row_key
@@ -50,6 +50,142 @@ def plain_number(value):
     return '%.0f' % float(value)
 
 
+# Most values a compiled number format remembers the output of
+MEMO_SIZE = 4096
+
+
+class NumberFormat(object):
+    """Compiled number format: values rounded half up to a fixed precision,
+    with a thousands delimiter (remembered, so serve a single column)
+
+    Example:
+    >>> f = NumberFormat(2)
+    >>> f(1234.565), f('1234.565'), f(-123), f(''), f('--')
+    ('1,234.57', '1,234.57', '-123.00', '', '--')
+    >>> NumberFormat(1, scale=100, template='%s%%')(0.1234)
+    '12.3%'
+    """
+
+    def __init__(self, precision=0, delim=',', scale=None, template='%s'):
+        self.precision = max(int(precision or 0), 0)
+        self.unit = 10 ** self.precision
+        self.delim = delim
+        self.scale = scale
+        self.template = template
+        self._memo = {}
+
+    @_handle_format_error
+    def __call__(self, value):
+        # zeros are not remembered, -0.0 equals 0 but keeps its sign (and 
+        #   True and False equal 1 and 0, but are not numbers)
+        if not value or type(value) is bool:
+            return self.format(value)
+        try:
+            return self._memo[value]
+        except KeyError:
+            result = self.format(value)
+            if len(self._memo) < MEMO_SIZE:
+                self._memo[value] = result
+            return result
+
+    def batch(self, values):
+        """Return list of formatted values of a column slice (list or 
+        array), remembered values taken straight from the memo
+
+        Example:
+        >>> NumberFormat(1).batch([1.25, 1.25, ''])
+        ['1.3', '1.3', '']
+        """
+        memo = self._memo
+        return [memo[value] if value in memo and type(value) is not bool
+                else self(value) for value in values]
+
+    def format(self, value):
+        """Return formatted value (not remembered)"""
+        if self.scale is not None:
+            if value == '':
+                return ''
+            try:
+                value = self.scale * float(value)
+            except ValueError:
+                return '--'
+        return self.template % self._number(value)
+
+    def _number(self, value):
+        """Return value rounded and delimited"""
+        # Return empty values with no change
+        if value == '':
+            return ''
+        try:
+            float(value)
+        except ValueError:
+            return value
+
+        # plain decimals are rounded on their digits as integers, anything 
+        #   else (exponents, signs, whitespace, nan) through Decimal
+        text = str(value)
+        negative = text.startswith('-')
+        whole, point, fraction = text[negative:].partition('.')
+        if not whole.isdigit() or fraction and not fraction.isdigit():
+            return self._decimal(text)
+
+        precision = self.precision
+        if len(fraction) > precision:
+            digits = int(whole + fraction[:precision])
+            if fraction[precision] >= '5':
+                digits += 1
+        else:
+            digits = int(whole + fraction.ljust(precision, '0'))
+
+        if precision:
+            whole, fraction = divmod(digits, self.unit)
+            text = '%s.%0*d' % (format(whole, ','), precision, fraction)
+        else:
+            text = format(digits, ',')
+        if self.delim != ',':
+            text = text.replace(',', self.delim)
+        return '-' + text if negative else text
+
+    def _decimal(self, text):
+        """Return decimal string rounded and delimited"""
+        try:
+            value = Decimal(text).quantize(Decimal(1).scaleb(-self.precision),
+                    rounding=ROUND_HALF_UP)
+        except InvalidOperation:
+            return '--'
+        whole, point, fraction = format(value, ',f').partition('.')
+        return whole.replace(',', self.delim) + point + fraction
+
+
+def number_format(precision=0, delim=','):
+    """Return compiled number format (see number) for a column"""
+    return NumberFormat(precision, delim)
+
+
+def percent_format(precision=0):
+    """Return compiled percentage format (see percent) for a column"""
+    return NumberFormat(precision, scale=100, template='%s%%')
+
+
+def currency_format():
+    """Return compiled currency format (see currency) for a column"""
+    return NumberFormat(2, template='$%s')
+
+
+# Compiled formats of the format methods (by parameters), shared by every
+#   call of the method itself
+_formats = {}
+
+
+def _shared_format(factory, *params):
+    """Return compiled format made by factory from params, made once"""
+    try:
+        return _formats[factory, params]
+    except KeyError:
+        result = _formats[factory, params] = factory(*params)
+        return result
+
+
 @_handle_format_error
 def number(value, precision=0, delim=','):
     """Format value as number with thousands sep. with fixed precision.
@@ -67,40 +203,14 @@ def number(value, precision=0, delim=','):
     '0.8'
     >>> number(0.75, 0)
     '1'
+    >>> number(-123456)
+    '-123,456'
+    >>> number(1.5e-7, 8)
+    '0.00000015'
     >>> number('--')
     '--'
     """
-    # Return empty values with no change
-    if value == '':
-        return ''
-
-    try:
-        float(value)
-    except ValueError:
-        return value
-
-    try:
-        d = '.' + ('1' * int(precision))
-        value = Decimal(str(value)).quantize(Decimal(d), rounding=ROUND_HALF_UP)
-    except (TypeError, InvalidOperation):
-        value = Decimal(str(value)).quantize(Decimal('1.'), rounding=ROUND_HALF_UP)
-    
-    value = reversed(list(str(value)))
-
-    # Rewrite decimal portion
-    new_value = []
-    if precision:
-        for character in value:
-            new_value.append(character)
-            if character == '.':
-                break
-    
-    # Add thousands delim every three characters
-    new_value.extend("%s%s" % (s, delim) if i and not i % 3 else s 
-            for i, s in enumerate(value))
-
-    # Put value back together before we return
-    return ''.join(reversed(new_value))
+    return _shared_format(number_format, precision, delim)(value)
 
 
 @_handle_format_error
@@ -119,13 +229,7 @@ def percent(value, precision=0):
     >>> percent('--')
     '--'
     """
-    # Avoid exceptions from empty cells
-    if value == '': 
-        return ''
-    try:
-        return "%s%%" % number(100 * float(value), precision)
-    except ValueError:
-        return '--'
+    return _shared_format(percent_format, precision)(value)
 
 
 @_handle_format_error
@@ -140,5 +244,13 @@ def currency(value):
     >>> currency(12322.127)
     '$12,322.13'
     """
-    return "$%s" % number(value, 2)
+    return _shared_format(currency_format)(value)
+
+
+# Compiled format factories of the format methods (see 
+#   datagrid.formattools.parse_options)
+FORMATS = {
+        number: number_format,
+        percent: percent_format,
+        currency: currency_format}
 
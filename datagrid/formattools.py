@@ -18,6 +18,57 @@
 
 """Tools for dealing with column formatting options"""
 
+from functools import partial
+
+
+class StrFormat(object):
+    """Formatter substituting values into a str format
+
+    Example:
+    >>> StrFormat('%.1f').batch([1, 2.25])
+    ['1.0', '2.2']
+    """
+
+    def __init__(self, template):
+        self.template = template
+
+    def __call__(self, value):
+        return self.template % value
+
+    def batch(self, values):
+        """Return list of formatted values of a column slice"""
+        template = self.template
+        return [template % value for value in values]
+
+
+class FormatChain(object):
+    """Formatter passing values through a series of formatters, the output
+    of each being the input of the next; column slices pass through the 
+    batch form of each in turn (see batch_formatter)
+
+    Example:
+    >>> import datagrid.format
+    >>> f = FormatChain([StrFormat('%.0f'), datagrid.format.number_format()])
+    >>> f(1234.5), f.batch([1234.5, 12])
+    ('1,234', ['1,234', '12'])
+    """
+
+    def __init__(self, stages):
+        self.stages = tuple(stages)
+        self._batches = tuple(batch_formatter(f) for f in self.stages)
+
+    def __call__(self, value):
+        for stage in self.stages:
+            value = stage(value)
+        return value
+
+    def batch(self, values):
+        """Return list of formatted values of a column slice"""
+        for batch in self._batches:
+            values = batch(values)
+        return values
+
+
 def str_formatter(string):
     """
     Return str formatter from given string
@@ -27,7 +78,36 @@ def str_formatter(string):
     >>> f(10)
     '10.0'
     """
-    return lambda v: string % v
+    return StrFormat(string)
+
+
+def numbers_only(formatter):
+    """Return formatter formatting numbers with formatter, and returning any
+    other value as it is (eg: text in a column promoted to str as the data 
+    was read, see datagrid.datatools.TypedRows)
+
+    Example:
+    >>> import datagrid.format
+    >>> f = numbers_only(datagrid.format.plain_number)
+    >>> f(1.6), f('n/a')
+    ('2', 'n/a')
+    """
+    return lambda value: formatter(value) \
+            if isinstance(value, (int, long, float)) else value
+
+
+def batch_formatter(formatter):
+    """Return batch form of formatter: a function of a list of values
+    returning the list of their formatted values
+
+    Example:
+    >>> batch_formatter(str.upper)(['a', 'b'])
+    ['A', 'B']
+    """
+    batch = getattr(formatter, 'batch', None)
+    if callable(batch):
+        return batch
+    return partial(map, formatter)
 
 
 def parse_options(formatters):
@@ -36,10 +116,10 @@ def parse_options(formatters):
 
     Example:
     >>> formatters = parse_options(['colA|percent:1','colB|%.0f|percent:1'])
-    >>> type(formatters['colA'])
-    <type 'function'>
-    >>> type(formatters['colB'])
-    <type 'function'>
+    >>> formatters['colA'].precision
+    1
+    >>> formatters['colB'].batch([1, 2.4])
+    ['100.0%', '200.0%']
     >>> funcs = parse_options(['Score|percent:1', 'Z-Score|%0.2f'])
 
     >>> funcs['Score'](0.99)
@@ -81,22 +161,35 @@ def parse_options(formatters):
                         parameters = [p.strip() for p in parameters.split(',')]
                         
                         # pass through params given on console
-                        methods[i] = make_fun(method, *parameters)
+                        methods[i] = _column_format(method, parameters) \
+                                or make_fun(method, *parameters)
 
                     # no parameters were found with method
                     else:
-                        methods[i] = vars(datagrid.format)[method]
+                        method = vars(datagrid.format)[method]
+                        methods[i] = _column_format(method, []) or method
 
-            # Consolidate function into one callable, so that when we call 
-            # returned function c, it's really calling a then passing the 
+            # Consolidate methods into one formatter, so that when we call
+            # returned formatter c, it's really calling a then passing the 
             # results through b.    (given we have method list [a,b])
-            formatters[key] = reduce(_create_flow, methods)
+            if len(methods) == 1:
+                formatters[key] = methods[0]
+            else:
+                formatters[key] = FormatChain(methods)
 
     # return parsed formatters dictionary
     return formatters
 
 
-def _create_flow(function_a, function_b):
-    """Generate lambda to be used in formatter flow"""
-    return lambda x: function_b(function_a(x))
-
+def _column_format(method, parameters):
+    """Return compiled format of method for a single column (with its own 
+    memo, see datagrid.format.NumberFormat), or None if method has none or
+    the parameters do not fit it"""
+    import datagrid.format
+    factory = datagrid.format.FORMATS.get(method)
+    if factory is None:
+        return None
+    try:
+        return factory(*parameters)
+    except (TypeError, ValueError):
+        return None
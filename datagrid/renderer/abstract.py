@@ -33,6 +33,17 @@ class Renderer(object):
         """Generate table's outer display"""
         pass
 
+    def stream(self, config, head, body, tail):
+        """Generate table's outer display in chunks
+
+        body is an iterator of rendered rows and tail a callable returning 
+        the rendered footer (available once body is exhausted).  Renderers
+        that can emit output incrementally should override this; by default
+        the whole table is built with table().
+        """
+        body = ''.join(body)
+        return iter([self.table(config, head, body, tail())])
+
     @abstractmethod
     def row(self, config, style, level, name=None, value=None): 
         """Generate table row"""
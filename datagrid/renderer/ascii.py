@@ -46,6 +46,11 @@ class Renderer(datagrid.renderer.abstract.Renderer):
         """Prepare renderer to render new table."""
         self.config = config
 
+        # drop anything captured from a previous table
+        self._currentrow = []
+        self._bodyrows = []
+        self._tailrow = []
+
         # initial column widths from headers
         self.columnwidths = [len(column) for column in config.columns]
             
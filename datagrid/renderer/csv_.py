@@ -34,6 +34,13 @@ class Renderer(datagrid.renderer.abstract.Renderer):
         """Generate CSV file from head/body csv chunks"""
         return ''.join([head, body, foot])
 
+    def stream(self, config, head, body, foot):
+        """Generate CSV file chunks from head/body csv chunks"""
+        yield head
+        for row in body:
+            yield row
+        yield foot()
+
     def row(self, config, style, cells, level=0, name=None, value=None):
         """Generate CSV row from list of cell values"""
         rowdata, self.currentrow = self.currentrow, []
@@ -49,7 +56,8 @@ class Renderer(datagrid.renderer.abstract.Renderer):
         return _makecsvrow(config.columns)
 
     def tail(self, config, data):
-        """CSV file requires no tail record.. skip"""
+        """CSV file requires no tail record.. skip (dropping its cells)"""
+        self.currentrow = []
         return ''
 
 
@@ -34,21 +34,39 @@ class Renderer(datagrid.renderer.abstract.Renderer):
 
     def table(self, config, thead, tbody, tfoot):
         """Generate HTML table from pregenerated head/body/tail sections"""
+        return ''.join([self._table_start(config, thead), tbody,
+                self._table_end(config, tfoot)])
+
+
+    def stream(self, config, thead, tbody, tfoot):
+        """Generate HTML table chunks from head/body/tail sections"""
+        yield self._table_start(config, thead)
+        for row in tbody:
+            yield row
+        yield self._table_end(config, tfoot())
+
+
+    def _table_start(self, config, thead):
+        """Opening table markup, through the start of tbody"""
         return """
-            <table id='%s' class='%s' cols='%s'>%s<tbody>%s</tbody>%s</table>
+            <table id='%s' class='%s' cols='%s'>%s<tbody>""" % (
+                    self.html_id, self.html_class, len(config.columns), thead)
+
+
+    def _table_end(self, config, tfoot):
+        """Closing table markup, from the end of tbody"""
+        return """</tbody>%s</table>
             <script type='text/javascript'>
                 if (typeof DataGrid_Meta == 'undefined') DataGrid_Meta = {};
                 DataGrid_Meta['%s'] = %s;
             </script>
-            """ % (self.html_id, self.html_class, 
-                    len(config.columns), thead, tbody, tfoot, 
-                    self.html_id, self.metadata(config))
+            """ % (tfoot, self.html_id, self.metadata(config))
 
 
     def metadata(self, config):
         """Report MetaData (JS)"""
         return json.dumps({
-            'allcolumns': config._allcolumns})
+            'allcolumns': config.allcolumns})
 
 
     def row(self, config, style, cells, level=0, name=None, value=None):
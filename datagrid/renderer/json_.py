@@ -33,6 +33,13 @@ class Renderer(datagrid.renderer.abstract.Renderer):
         """Generate JSON file from head/body json chunks"""
         return "[" + ''.join([head, body]) + "]"
 
+    def stream(self, config, head, body, foot):
+        """Generate JSON file chunks from head/body json chunks"""
+        yield "[" + head
+        for row in body:
+            yield row
+        yield "]"
+
     def row(self, config, style, cells, level=0, name=None, value=None):
         """Generate JSON row from list of cell values"""
         rowdata, self.currentrow = self.currentrow, []
@@ -48,5 +55,6 @@ class Renderer(datagrid.renderer.abstract.Renderer):
         return json.dumps(config.columns)
 
     def tail(self, config, data):
-        """JSON file requires no tail record.. skip"""
+        """JSON file requires no tail record.. skip (dropping its cells)"""
+        self.currentrow = []
         return ''
@@ -0,0 +1,272 @@
+#------------------------------------------------------------------------#
+# DataGrid - Tabular Data Rendering Library
+# Copyright (C) 2009-2010 Adam Wagner <awagner@redventures.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#------------------------------------------------------------------------#
+
+"""Compiled (render-ready) grid results, rendered any number of times by any
+number of renderers"""
+
+from collections import namedtuple
+from itertools import islice
+
+
+# Row of a compiled grid
+#   data: row values (raw and calculated columns, unformatted)
+#   style: row style
+#   cells: (style, formatted value) pair for each display column
+#   level, name, value: aggregate row information passed to renderer.row
+#       (name is None for detail rows)
+ResultRow = namedtuple('ResultRow', 'data style cells level name value')
+
+# Aggregate row of a compiled grid, with the rows beneath it (ResultGroups or
+#   detail ResultRows) in display order
+ResultGroup = namedtuple('ResultGroup', 'row children')
+
+# Number of rows a ResultStream compiles at a time
+STREAM_CHUNK = 1024
+
+# Name of the column naming the grouping set of each row of CompiledSets
+SET_COLUMN = 'grouping set'
+
+
+class ResultStream(object):
+    """Detail rows of a compiled grid that are styled and formatted as they
+    are read (each time they are read, STREAM_CHUNK rows at a time), rather 
+    than held in memory
+
+    Params:
+        rows: re-iterable sequence of rows (eg: datagrid.extsort.SortedRows),
+            or an iterator, which may only be read once
+        compile_rows: function returning the ResultRows for a list of rows of
+            data
+        offset: number of leading rows skipped
+        limit: maximum number of rows read (None for no limit)
+
+    Example:
+    >>> stream = ResultStream(iter('abc'), lambda rows: map(str.upper, rows),
+    ...         1)
+    >>> list(stream)
+    ['B', 'C']
+    >>> list(stream)
+    Traceback (most recent call last):
+        ...
+    ValueError: Result stream has already been read
+    """
+    __slots__ = ('rows', 'compile_rows', 'offset', 'limit', 'read')
+
+    def __init__(self, rows, compile_rows, offset=0, limit=None):
+        self.rows = rows
+        self.compile_rows = compile_rows
+        self.offset = offset
+        self.limit = limit
+        self.read = False
+
+    def __iter__(self):
+        if self.read and iter(self.rows) is self.rows:
+            raise ValueError('Result stream has already been read')
+        self.read = True
+        stop = None if self.limit is None else self.offset + self.limit
+        return self._compile(islice(self.rows, self.offset, stop))
+
+    def _compile(self, rows):
+        """Generate ResultRows of rows, compiling a chunk at a time"""
+        while True:
+            chunk = list(islice(rows, STREAM_CHUNK))
+            if not chunk:
+                return
+            for row in self.compile_rows(chunk):
+                yield row
+
+
+class CompiledGrid(object):
+    """Render-ready result of a DataGrid (see DataGrid.compile), given to
+    renderers as their config
+
+    Attributes:
+        columns: display column names
+        allcolumns: names of all (raw and calculated) columns
+        labels, descriptions, groupby, suppressdetail: as set on the grid
+        body: ResultGroups (grouped grids) or ResultRows in display order
+            (a ResultStream for externally sorted or streamed grids)
+        tail: totals ResultRow (given as a function returning it when the 
+            totals are only known once a streamed body has been read)
+
+    Example:
+    >>> import datagrid.renderer.csv_
+    >>> row = ResultRow((1,), '', (('', '1'),), 0, None, None)
+    >>> tail = ResultRow(('',), '', (('', ''),), 0, None, None)
+    >>> result = CompiledGrid(('a',), ('a',), [], {}, [], False, (row,), tail)
+    >>> result.render(datagrid.renderer.csv_.Renderer())
+    'a\\r\\n1\\r\\n'
+    """
+    __slots__ = ('columns', 'allcolumns', 'labels', 'descriptions',
+            'groupby', 'suppressdetail', 'body', '_tail')
+
+    def __init__(self, columns, allcolumns, labels, descriptions, groupby,
+            suppressdetail, body, tail):
+        self.columns = tuple(columns)
+        self.allcolumns = tuple(allcolumns)
+        self.labels = tuple(labels)
+        self.descriptions = dict(descriptions)
+        self.groupby = tuple(groupby)
+        self.suppressdetail = suppressdetail
+        if isinstance(body, ResultStream):
+            self.body = body
+        else:
+            self.body = tuple(body)
+        self._tail = tail
+
+    @property
+    def tail(self):
+        """Totals ResultRow"""
+        if callable(self._tail):
+            return self._tail()
+        return self._tail
+
+    def rows(self):
+        """Generate every body ResultRow (aggregate and detail) in display
+        order"""
+        stack = [iter(self.body)]
+        while stack:
+            for item in stack[-1]:
+                if isinstance(item, ResultGroup):
+                    yield item.row
+                    stack.append(iter(item.children))
+                    break
+                yield item
+            else:
+                stack.pop()
+
+    def render(self, renderer):
+        """Render compiled grid into requested tabular form (via renderer)"""
+        self._setup(renderer)
+        head = renderer.head(self)
+        body = ''.join(self._iter_body(renderer))
+        tail = self._render_tail(renderer)
+        return renderer.table(self, head, body, tail)
+
+    def iter_render(self, renderer):
+        """Render compiled grid, returning an iterator of output chunks (see
+        DataGrid.iter_render)"""
+        self._setup(renderer)
+        head = renderer.head(self)
+        body = self._iter_body(renderer)
+        tail = lambda: self._render_tail(renderer)
+
+        if hasattr(renderer, 'stream'):
+            return renderer.stream(self, head, body, tail)
+        return iter([renderer.table(self, head, ''.join(body), tail())])
+
+    def render_to(self, fileobj, renderer):
+        """Render compiled grid, writing output to fileobj as it is produced
+        """
+        for chunk in self.iter_render(renderer):
+            fileobj.write(chunk)
+
+    def _setup(self, renderer):
+        """Run renderer setup logic (if it has any)"""
+        if hasattr(renderer, 'setup'):
+            renderer.setup(self)
+
+    def _iter_body(self, renderer):
+        """Generate rendered body rows"""
+        for row in self.rows():
+            yield renderer.row(self, row.style,
+                    self._render_cells(renderer, row), level=row.level,
+                    name=row.name, value=row.value)
+
+    def _render_tail(self, renderer):
+        """Render table footer (totals row)"""
+        return renderer.tail(self, self._render_cells(renderer, self.tail))
+
+    def _render_cells(self, renderer, row):
+        """Render block of cells within a single row"""
+        return ''.join(renderer.cell(self, style, value, i)
+                for i, (style, value) in enumerate(row.cells))
+
+
+class CompiledSets(object):
+    """Render-ready result of a DataGrid with grouping sets (see
+    DataGrid.compile), rendered as a single table (see table)
+
+    Attributes:
+        sets: grouping sets (tuples of column names)
+        sections: CompiledGrid of each grouping set
+        tail: totals ResultRow
+    """
+    __slots__ = ('sets', 'sections', 'tail')
+
+    def __init__(self, sets, sections, tail):
+        self.sets = tuple(tuple(s) for s in sets)
+        self.sections = tuple(sections)
+        self.tail = tail
+
+    def section(self, groupset):
+        """Return CompiledGrid of grouping set (sequence of column names)"""
+        return self.sections[self.sets.index(tuple(groupset))]
+
+    def aggregates(self, groupset):
+        """Return mapping of group values (tuple, in grouping set order) to
+        aggregate row data for grouping set"""
+        section = self.section(groupset)
+        columns = [section.allcolumns.index(c) for c in groupset]
+        return dict((tuple(row.data[i] for i in columns), row.data) 
+                for row in section.body)
+
+    def table(self):
+        """Return CompiledGrid of the rows of every section in set order (the
+        grand total set's being the totals), led by a SET_COLUMN
+
+        Example:
+        >>> import datagrid.renderer.csv_
+        >>> row = ResultRow((1,), '', (('', '1'),), 0, None, None)
+        >>> tail = ResultRow((1,), '', (('', '1'),), 0, None, None)
+        >>> section = CompiledGrid(('a',), ('a',), [], {}, [], False, 
+        ...         (row,), tail)
+        >>> result = CompiledSets([['a'], []], [section, section], tail)
+        >>> result.render(datagrid.renderer.csv_.Renderer())
+        'grouping set,a\\r\\n(a),1\\r\\n(),1\\r\\n'
+        """
+        body = []
+        for groupset, section in zip(self.sets, self.sections):
+            label = '(%s)' % ', '.join(groupset)
+            rows = section.body if groupset else (self.tail,)
+            body.extend(_labelled(row, label) for row in rows)
+
+        first = self.sections[0]
+        return CompiledGrid((SET_COLUMN,) + first.columns, 
+                (SET_COLUMN,) + first.allcolumns, first.labels, 
+                first.descriptions, (), False, body, 
+                _labelled(self.tail, ''))
+
+    def render(self, renderer):
+        """Render sets into requested tabular form (see table)"""
+        return self.table().render(renderer)
+
+    def iter_render(self, renderer):
+        """Render sets, returning an iterator of output chunks"""
+        return self.table().iter_render(renderer)
+
+    def render_to(self, fileobj, renderer):
+        """Render sets, writing output to fileobj as it is produced"""
+        self.table().render_to(fileobj, renderer)
+
+
+def _labelled(row, label):
+    """Return aggregate ResultRow led by a (plain) label cell"""
+    return row._replace(data=(label,) + tuple(row.data), 
+            cells=(('', label),) + tuple(row.cells), level=0, name=None,
+            value=None)
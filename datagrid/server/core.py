@@ -22,6 +22,8 @@ import SimpleHTTPServer
 import threading
 from time import sleep
 
+from datagrid.cache import ResultCache
+
 class HTTPServer:
     """
     Simple HTTP Server
@@ -30,15 +32,21 @@ class HTTPServer:
     # internal SocketServer instance
     server = None
 
-    def __init__(self, handler=None, port=8080):
-        """Configure Server Setup"""
+    def __init__(self, handler=None, port=8080, cache=None):
+        """Configure Server Setup
+
+        Rendered grids are cached in cache (a datagrid.cache.ResultCache, 
+        by default one held in memory), shared by every request handler.
+        """
         self.port = port
         self.handler = handler or DefaultHandler
+        self.cache = cache if cache is not None else ResultCache()
 
     def run(self):
         """Start Server"""
         self.server = SocketServer.ThreadingTCPServer(
                 ('localhost', self.port), self.handler)
+        self.server.cache = self.cache
         print "serving at http://localhost:", self.port
         try:
             server_thread = threading.Thread(target=self.server.serve_forever)
@@ -63,3 +71,15 @@ class DefaultHandler(SimpleHTTPServer.SimpleHTTPRequestHandler):
             # current working directory
             SimpleHTTPServer.SimpleHTTPRequestHandler.do_GET(self)
 
+    def render_grid(self, grid, renderer, fingerprint, 
+            content_type='text/html'):
+        """Respond with grid rendered by renderer, reusing the server's 
+        cached output for data with the same fingerprint (see 
+        datagrid.cache), configuration and renderer"""
+        output = self.server.cache.render(grid, renderer, fingerprint)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(output)))
+        self.end_headers()
+        self.wfile.write(output)
+
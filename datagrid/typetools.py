@@ -0,0 +1,194 @@
+#------------------------------------------------------------------------#
+# DataGrid - Tabular Data Rendering Library
+# Copyright (C) 2009-2010 Adam Wagner <awagner@redventures.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#------------------------------------------------------------------------#
+
+"""Tools for dealing with column types
+
+Types:
+    str: text (interned, see interned)
+    float, int: numbers
+    decimal[:places]: fixed-point decimal, rounded half up to places
+    date[:form]: date, in iso (YYYY-MM-DD) [default] or mdy (MM/DD/YYYY)
+        form
+"""
+
+import datetime
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+
+
+# Value of null cells
+NULL = None
+
+# Empty values of a DataGrid (see datagrid.core.DataGrid)
+EMPTY = ('', NULL)
+
+# Spellings of null cells read by default
+NULLS = ('',)
+
+
+def interned(value):
+    """Convert value to an interned str"""
+    return intern(str(value))
+
+
+def decimal(places=None):
+    """Return converter to fixed-point decimal, rounded half up to places
+    (as given, without places)
+
+    Example:
+    >>> decimal(2)('1.005'), decimal()('1.005')
+    (Decimal('1.01'), Decimal('1.005'))
+    """
+    if places is None:
+        exponent = None
+    else:
+        exponent = Decimal(1).scaleb(-int(places))
+
+    def convert(value):
+        try:
+            result = Decimal(value)
+        except InvalidOperation:
+            raise ValueError('Invalid decimal: %r' % (value,))
+        if exponent is None:
+            return result
+        return result.quantize(exponent, rounding=ROUND_HALF_UP)
+    return convert
+
+
+def iso_date(value):
+    """Convert YYYY-MM-DD text to date
+
+    Example:
+    >>> iso_date('2010-03-09')
+    datetime.date(2010, 3, 9)
+    """
+    # str.split (rather than value.split) raises TypeError for other values
+    year, month, day = str.split(value, '-')
+    return datetime.date(int(year), int(month), int(day))
+
+
+def mdy_date(value):
+    """Convert MM/DD/YYYY text to date
+
+    Example:
+    >>> mdy_date('3/09/2010')
+    datetime.date(2010, 3, 9)
+    """
+    month, day, year = str.split(value, '/')
+    return datetime.date(int(year), int(month), int(day))
+
+
+def date(form='iso'):
+    """Return converter to date from text in form (iso or mdy)"""
+    try:
+        return {'iso': iso_date, 'mdy': mdy_date}[form]
+    except KeyError:
+        raise ValueError('Unknown date form: %s' % form)
+
+
+# Column types by name (see parse_options); types made by a function are
+#   given its parameters after a colon
+TYPES = {
+        'str': str,
+        'float': float,
+        'int': int,
+        'decimal': decimal,
+        'date': date}
+
+
+def parse_options(types):
+    """Return column types for type options passed to rendergrid (type
+    names, in column order)
+
+    Example:
+    >>> types = parse_options(['str', 'int', 'decimal:2', 'date:mdy'])
+    >>> types[:2], types[2]('2.5'), types[3]('12/31/2009')
+    ([<type 'str'>, <type 'int'>], Decimal('2.50'), datetime.date(2009, 12, 31))
+    """
+    result = []
+    for option in types:
+        name, params = option.partition(':')[::2]
+        method = TYPES[name]
+        if isinstance(method, type):
+            if params:
+                raise ValueError('%s takes no parameters %s' % (name, params))
+        else:
+            try:
+                method = method(*params.split(',') if params else ())
+            except TypeError:
+                raise ValueError('%s takes no parameters %s' % (name, params))
+        result.append(method)
+    return result
+
+
+def row_converter(types, nulls=NULLS, salvage=None):
+    """Return function converting a row (sequence of text) to a list of
+    values of types, null cells (any of nulls) becoming NULL
+
+    Example:
+    >>> convert = row_converter([str, float, int], ['', 'NULL'])
+    >>> convert(['a', '1.5', '2']), convert(['b', 'NULL', ''])
+    (['a', 1.5, 2], ['b', None, None])
+    >>> convert(['c', 'x', '3', 'extra'])
+    ['c', 'x', 3, 'extra']
+    """
+    nulls = frozenset(nulls)
+    if salvage is None:
+        salvage = lambda row: salvage_row(types, nulls, row)
+    if not types:
+        return salvage
+
+    # str columns are interned with the intern builtin, which takes str
+    #   only (other values are salvaged)
+    env = {'NULL': NULL, 'NULLS': nulls, 'salvage': salvage}
+    names = []
+    cells = []
+    for i, t in enumerate(types):
+        env['c%d' % i] = intern if t is str else t
+        names.append('v%d' % i)
+        cells.append('NULL if v%d in NULLS else c%d(v%d)' % (i, i, i))
+
+    source = ('def convert(row):\n'
+            '    try:\n'
+            '        %s, = row\n'
+            '        return [%s]\n'
+            '    except (TypeError, ValueError):\n'
+            '        return salvage(row)\n') % (', '.join(names),
+            ', '.join(cells))
+    code = compile(source, '<converter>', 'exec')
+    exec code in env  # pylint: disable-msg=W0122
+    return env['convert']
+
+
+def salvage_row(types, nulls, row):
+    """Convert row cell by cell, leaving values that do not convert (and
+    columns beyond types) as they are
+
+    Example:
+    >>> salvage_row([float, float], [''], ['1', 'a', '', 'b'])
+    [1.0, 'a', '', 'b']
+    """
+    new_row = []
+    for i, value in enumerate(row):
+        if i < len(types):
+            convert = interned if types[i] is str else types[i]
+            try:
+                value = NULL if value in nulls else convert(value)
+            except (TypeError, ValueError):
+                pass
+        new_row.append(value)
+    return new_row
@@ -0,0 +1,212 @@
+#------------------------------------------------------------------------#
+# DataGrid - Tabular Data Rendering Library
+# Copyright (C) 2009-2010 Adam Wagner <awagner@redventures.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#------------------------------------------------------------------------#
+
+"""Vectorized (NumPy) storage backend: datagrid.columnar with numeric columns
+held as ndarrays (NumpyStore raises ImportError without numpy)"""
+
+from itertools import izip
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from datagrid import accumulate
+from datagrid.calctools import calculation_order, formula_references, \
+        compile_vector_formula
+from datagrid.columnar import ColumnStore, NumericColumn, EncodedColumn
+from datagrid.datatools import GroupNode
+from datagrid.typetools import NULL, EMPTY
+
+
+class ArrayColumn(object):
+    """Column of numbers held in an ndarray, with masks ((boolean array, value)
+    pairs) giving the value of cells that hold no number"""
+
+    def __init__(self, values, masks=()):
+        self.values = values
+        self.masks = [(mask, fill) for mask, fill in masks if mask.any()]
+
+    @classmethod
+    def from_column(cls, column):
+        """Convert datagrid.columnar.NumericColumn to ArrayColumn"""
+        values = numpy.frombuffer(column.values, column.typecode)
+        masks = {}
+        for i, fill in column.empty.iteritems():
+            if fill not in masks:
+                masks[fill] = numpy.zeros(len(values), bool)
+            masks[fill][i] = True
+        return cls(values, [(mask, fill) for fill, mask in masks.iteritems()])
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        for mask, fill in self.masks:
+            if mask[i]:
+                return fill
+        return self.values.item(i)
+
+    def __iter__(self):
+        return iter(self.take(slice(None)))
+
+    def take(self, selection):
+        """Return values found at the given row indexes (as a list)"""
+        values = self.values[selection].tolist()
+        for mask, fill in self.masks:
+            for i in numpy.flatnonzero(mask[selection]):
+                values[i] = fill
+        return values
+
+    def valid(self, selection):
+        """Return ndarray of the (unmasked) numbers at the given indexes"""
+        values = self.values[selection]
+        if self.masks:
+            masked = numpy.zeros(len(values), bool)
+            for mask, fill in self.masks:
+                masked |= mask[selection]
+            values = values[~masked]
+        return values
+
+
+# Accumulators whose partial state has a vectorized equivalent (each
+#   reduction receives a non-empty ndarray)
+VECTOR_PARTIALS = {
+        accumulate.Sum: lambda v: v.sum().item(),
+        accumulate.Min: lambda v: v.min().item(),
+        accumulate.Max: lambda v: v.max().item(),
+        accumulate.Avg: lambda v: [v.sum().item(), len(v)],
+        accumulate.DistinctLen: lambda v: set(numpy.unique(v).tolist())}
+
+
+class NumpyStore(ColumnStore):
+    """ColumnStore with ndarray-backed numeric columns and selections"""
+
+    def __init__(self, rows=()):
+        if numpy is None:
+            raise ImportError('The numpy backend requires numpy')
+        ColumnStore.__init__(self, rows)
+        self.columns = [ArrayColumn.from_column(c)
+                if isinstance(c, NumericColumn) else c for c in self.columns]
+
+    def selection(self):
+        """Return selection covering every row in store"""
+        return numpy.arange(self.length)
+
+    def filter(self, predicate, selection):
+        """Return selection of rows for which predicate(row index) is true"""
+        return numpy.fromiter((i for i in selection if predicate(i)),
+                numpy.intp)
+
+    def rows(self, selection, extra=()):
+        """Generate row lists for the selected rows (followed by values from
+        extra columns)"""
+        columns = [column.take(selection)
+                for column in self.columns + list(extra)]
+        return (list(row) for row in izip(*columns))
+
+    def accumulate(self, column, acc, selection):
+        """Return partial state of accumulator acc (see datagrid.accumulate)
+        over the non-empty values of column (by index) for the selected rows,
+        vectorized where possible."""
+        column = self.columns[column]
+        vector = VECTOR_PARTIALS.get(type(acc))
+        if vector is not None and isinstance(column, ArrayColumn):
+            values = column.valid(selection)
+            if not len(values):
+                return acc.init()
+            return vector(values)
+        return acc.update(acc.init(), 
+                [v for v in column.take(selection) if v not in EMPTY])
+
+    def group_tree(self, columns, selection):
+        """Group selection on the given columns (by index), returning a group
+        tree (see datagrid.datatools.group_tree) of ndarray selections"""
+        return self._group_tree(selection, [self._keys(i) for i in columns])
+
+    def _keys(self, column):
+        """Return (sortable key array, key decoding table) for column"""
+        column = self.columns[column]
+        if isinstance(column, EncodedColumn):
+            return numpy.frombuffer(column.codes, column.codes.typecode), \
+                    column.values
+        if isinstance(column, ArrayColumn) and not column.masks:
+            return column.values, None
+        return numpy.array(list(column), object), None
+
+    def _group_tree(self, selection, keys):
+        """Split selection into group segments on keys[0], then recurse"""
+        (codes, table), keys = keys[0], keys[1:]
+        selection = selection[numpy.argsort(codes[selection],
+                kind='mergesort')]
+        unique, starts = numpy.unique(codes[selection], return_index=True)
+
+        tree = {}
+        segments = numpy.split(selection, starts[1:])
+        for key, items in izip(unique.tolist(), segments):
+            if table is not None:
+                key = table[key]
+            node = tree[key] = GroupNode(items)
+            if keys:
+                node.children = self._group_tree(items, keys)
+        return tree
+
+    def calculate(self, calculations, columns):
+        """Return list of calculated columns, evaluated over whole columns
+        (None if any formula can not be vectorized)"""
+        if any(not isinstance(v, str) for v in calculations.itervalues()):
+            return None
+
+        vectors = list(self.columns) + [None] * len(calculations)
+        order = calculation_order(dict((k, formula_references(v))
+                for k, v in calculations.iteritems()))
+        with numpy.errstate(all='ignore'):
+            for name in order:
+                i = columns.index(name)
+                try:
+                    vectors[i] = self._calculate(calculations[name],
+                            columns, vectors)
+                except (TypeError, ValueError, AttributeError):
+                    return None
+        return vectors[len(self.columns):]
+
+    def _calculate(self, calc_string, columns, vectors):
+        """Evaluate single formula over columns, returning ArrayColumn"""
+        failed = numpy.zeros(self.length, bool)
+        operands = list(vectors)
+        for name in formula_references(calc_string):
+            column = vectors[columns.index(name)]
+            if not isinstance(column, ArrayColumn):
+                raise TypeError(name)
+            values = column.values.astype(float)
+            for mask, fill in column.masks:
+                # empty and failed cells fail, numbers (such as the 0 of a
+                #   division by zero) are operands like any other
+                if isinstance(fill, str) or fill is NULL:
+                    failed |= mask
+                else:
+                    values[mask] = fill
+            operands[columns.index(name)] = values
+
+        values = compile_vector_formula(calc_string, columns, operands)()
+        values = numpy.array(numpy.broadcast_to(values, (self.length,)))
+        zero = numpy.zeros(self.length, bool)
+        if values.dtype.kind == 'f':
+            zero = ~numpy.isfinite(values) & ~failed
+            values[zero] = 0
+        return ArrayColumn(values, [(failed, '--'), (zero, 0)])
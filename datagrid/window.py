@@ -0,0 +1,183 @@
+#------------------------------------------------------------------------#
+# DataGrid - Tabular Data Rendering Library
+# Copyright (C) 2009-2010 Adam Wagner <awagner@redventures.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#------------------------------------------------------------------------#
+
+"""Window Column Method Library (see DataGrid windowcolumns)
+
+Protocol:
+    column: name of the (raw or calculated) column the window reads
+    needs_total: whether init needs the partition's aggregate value
+    init: return new state for a partition, given the aggregate row value
+        of the column for the partition (None unless needs_total)
+    step: return the window value of the next row, given its column value
+        (may modify state)
+
+    running_sum(column): sum of the column's values so far
+    rank(column): rank in display order (rows with equal values share it)
+    moving_avg(column, size): average of the last size values
+    percent_of_total(column): share of the partition's aggregate value
+"""
+
+from abc import ABCMeta, abstractmethod
+from collections import deque
+
+from datagrid.typetools import EMPTY
+
+
+class WindowFunction(object):
+    """Abstract base class for window functions"""
+    __metaclass__ = ABCMeta
+
+    needs_total = False
+
+    def __init__(self, column):
+        self.column = column
+
+    @abstractmethod
+    def init(self, total):
+        """Return new state"""
+        pass
+
+    @abstractmethod
+    def step(self, state, value):
+        """Return window value of next row"""
+        pass
+
+    def __call__(self, values, total=None):
+        """Return window values of a list of values"""
+        state = self.init(total)
+        return [self.step(state, value) for value in values]
+
+
+class RunningSum(WindowFunction):
+    """Window function for the sum of values so far (empty values add
+    nothing)
+
+    Example:
+    >>> running_sum('a')([1, 2, '', 3])
+    [1, 3, 3, 6]
+    """
+
+    def init(self, total):
+        return [0]
+
+    def step(self, state, value):
+        if value not in EMPTY:
+            state[0] += value
+        return state[0]
+
+
+class Rank(WindowFunction):
+    """Window function for rank in display order, rows with equal values
+    sharing the rank of the first of them (sort on the column to rank by
+    it)
+
+    Example:
+    >>> rank('a')([9, 7, 7, 5])
+    [1, 2, 2, 4]
+    """
+
+    def init(self, total):
+        # rows seen, rank of previous row, previous value
+        return [0, 0, None]
+
+    def step(self, state, value):
+        state[0] += 1
+        if state[0] == 1 or value != state[2]:
+            state[1] = state[0]
+            state[2] = value
+        return state[1]
+
+
+class MovingAverage(WindowFunction):
+    """Window function for the average of the last size non-empty values
+    (fewer at the start of a partition), holding only those values
+
+    Example:
+    >>> moving_avg('a', 2)([1.0, 2.0, '', 4.0])
+    [1.0, 1.5, 1.5, 3.0]
+    """
+
+    def __init__(self, column, size):
+        WindowFunction.__init__(self, column)
+        if size < 1:
+            raise ValueError('Moving average size must be at least 1')
+        self.size = size
+
+    def init(self, total):
+        # frame of values, and their sum
+        return [deque(maxlen=self.size), 0]
+
+    def step(self, state, value):
+        frame = state[0]
+        if value not in EMPTY:
+            if len(frame) == self.size:
+                state[1] -= frame[0]
+            frame.append(value)
+            state[1] += value
+        if not frame:
+            return ''
+        return state[1] / len(frame)
+
+
+class PercentOfTotal(WindowFunction):
+    """Window function for each value's share of the partition's aggregate
+    value, as a fraction (see datagrid.format.percent)
+
+    Example:
+    >>> percent_of_total('a')([1, 3, '', 0], 4)
+    [0.25, 0.75, '', 0.0]
+    >>> percent_of_total('a')([1], 0)
+    [0]
+    """
+    needs_total = True
+
+    def init(self, total):
+        return total
+
+    def step(self, state, value):
+        if value in EMPTY:
+            return ''
+        try:
+            return value / float(state)
+        except ZeroDivisionError:
+            return 0
+        except (TypeError, ValueError):
+            return '--'
+
+
+# Window column methods
+def running_sum(column):
+    """Return window function for the running sum of column"""
+    return RunningSum(column)
+
+
+def rank(column):
+    """Return window function for the rank of rows by column (see Rank)"""
+    return Rank(column)
+
+
+def moving_avg(column, size):
+    """Return window function for the moving average of the last size
+    values of column"""
+    return MovingAverage(column, size)
+
+
+def percent_of_total(column):
+    """Return window function for the share of the group (or grand) total
+    of column held by each row (see PercentOfTotal)"""
+    return PercentOfTotal(column)
@@ -42,6 +42,8 @@ class DataGrid {
     const OPT_GROUPBY = 'groupby';
     const OPT_AGGREGATE ='aggregate';
     const OPT_AUTOCOLUMN = 'autocolumn';
+    const OPT_CACHE = 'cache';
+    const OPT_CACHETTL = 'cachettl';
     const OPT_CALCULATE = 'calculate';
     const OPT_DESCRIPTION = 'columndescription';
     const OPT_DISPLAY = 'display';
@@ -0,0 +1,95 @@
+#------------------------------------------------------------------------#
+# DataGrid - Tabular Data Rendering Library
+# Copyright (C) 2009-2010 Adam Wagner <awagner@redventures.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published 
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#------------------------------------------------------------------------#
+
+"""datagrid.approximate test module"""
+
+import unittest
+
+from datagrid.core import DataGrid
+from datagrid.approximate import approx_distinct, approx_median, \
+        approx_percentile, approx_top_k, ApproxDistinct, ApproxPercentile
+from datagrid.aggregatetools import parse_options
+
+
+def merged(acc, parts):
+    """Return aggregate result of merging the states of parts of data"""
+    state = acc.init()
+    for part in parts:
+        state = acc.merge(state, acc.update(acc.init(), part))
+    return acc.finalize(state)
+
+
+class TestApproximate(unittest.TestCase):
+    """Approximate aggregate unit-tests"""
+
+    def testDistinct(self):
+        # exact for small sets, within a few percent for large ones
+        self.assertEquals(3, approx_distinct(['a', 'b', 'a', 'c']))
+        values = ['id%d' % i for i in xrange(50000)]
+        self.assertTrue(abs(approx_distinct(values) - 50000) < 2500)
+
+        # overlapping parts merge into the distinct count of their union
+        parts = [values[i:i + 20000] for i in xrange(0, 50000, 10000)]
+        self.assertTrue(abs(merged(ApproxDistinct(), parts) - 50000) < 2500)
+
+    def testPercentile(self):
+        self.assertEquals(3, approx_median([5, 1, 4, 2, 3]))
+        values = range(100000)
+        parts = [values[i::7] for i in xrange(7)]
+        for q in (0.1, 0.5, 0.99):
+            result = merged(ApproxPercentile(q), parts)
+            self.assertTrue(abs(result - q * 100000) < 1000)
+        self.assertRaises(ValueError, approx_percentile, 1.5)
+        self.assertRaises(ValueError, approx_median, [])
+
+    def testTopK(self):
+        values = ['a'] * 500 + ['b'] * 300 + ['c%d' % i for i in xrange(2000)]
+        self.assertEquals('500 a, 300 b', approx_top_k(2)(values[:800]))
+        result = approx_top_k(2)(values).split(', ')
+        self.assertEquals(['a', 'b'], [r.split()[1] for r in result])
+
+    def testGroupRollup(self):
+        data = [[i % 3, i % 5, i] for i in xrange(300)]
+        grid = DataGrid(data, ['a', 'b', 'c'], groupby=['a', 'b'],
+                aggregate={'c': approx_distinct, 'b': approx_median},
+                suppressdetail=True)
+        rows = [row.data for row in grid.compile().rows()]
+        self.assertEquals((0, 2, 100), rows[0])
+        self.assertEquals((0, 0, 20), rows[1])
+        self.assertEquals(('', 2, 300), grid.compile().tail.data)
+
+    def testParseOptions(self):
+        # factories are made with their defaults, or rejected while parsing
+        method = parse_options(['a|approx_top_k'])['a']
+        self.assertEquals('2 b', method(['a', 'b', 'b']).split(', ')[0])
+        self.assertRaises(ValueError, parse_options, 
+                ['a|approx_percentile'])
+        self.assertRaises(ValueError, parse_options, 
+                ['a|approx_percentile:2'])
+
+        # aggregate methods are found before builtins, and names imported
+        #   into the aggregate modules are not found
+        self.assertRaises(KeyError, parse_options, ['a|defaultdict'])
+        self.assertRaises(KeyError, parse_options, ['a|ApproxTopK'])
+        self.assertTrue(parse_options(['a|sum', 'b|any'])['b'] is any)
+        self.assertRaises(KeyError, parse_options, ['a|nosuchmethod'])
+
+
+# Run tests if called from console
+if __name__ == '__main__':
+    unittest.main()
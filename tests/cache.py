@@ -0,0 +1,131 @@
+#------------------------------------------------------------------------#
+# DataGrid - Tabular Data Rendering Library
+# Copyright (C) 2009-2010 Adam Wagner <awagner@redventures.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#------------------------------------------------------------------------#
+
+"""datagrid.cache test module"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from functools import partial
+
+from datagrid.core import DataGrid
+from datagrid.cache import ResultCache, cache_key, content_fingerprint, \
+        normalize
+import datagrid.renderer.csv_
+
+
+def suffixed(suffix):
+    """Return formatter appending suffix (a closure, for key tests)"""
+    return lambda value: '%s%s' % (value, suffix)
+
+
+class TestResultCache(unittest.TestCase):
+    """Result cache unit-tests"""
+
+    def setUp(self):
+        """Setup for all tests in class"""
+        self.directory = tempfile.mkdtemp()
+        self.fingerprint = content_fingerprint('1,2\n3,4\n')
+
+    def tearDown(self):
+        """Cleanup and prep for next run"""
+        shutil.rmtree(self.directory)
+
+    def grid(self, **settings):
+        """Return grid of the fixture data that can not be compiled"""
+        grid = DataGrid([[1, 2], [3, 4]], ['a', 'b'], **settings)
+        grid.compile = None
+        return grid
+
+    def testMemoryEviction(self):
+        cache = ResultCache(memory=10)
+        cache.set('a', '1234')
+        cache.set('b', '1234')
+        cache.get('a')
+        cache.set('c', '1234')
+        self.assertEquals(['a', 'c'], list(cache.entries))
+        self.assertEquals(8, cache.size)
+
+        # results larger than the whole budget are not held
+        cache.set('d', '12345678901')
+        self.assertEquals(None, cache.get('d'))
+
+    def testDiskTier(self):
+        ResultCache(directory=self.directory).set('a', 'output')
+        cache = ResultCache(directory=self.directory, ttl=60)
+        self.assertEquals('output', cache.get('a'))
+
+        # expired results are removed
+        path = cache._path('a')
+        os.utime(path, (time.time() - 120, time.time() - 120))
+        self.assertEquals(None, ResultCache(directory=self.directory,
+                ttl=60).get('a'))
+        self.assertFalse(os.path.exists(path))
+
+    def testMemoryExpiry(self):
+        cache = ResultCache(ttl=60)
+        cache.set('a', 'output')
+        self.assertEquals('output', cache.get('a'))
+
+        # expired results are dropped from memory
+        cache.entries['a'] = (time.time() - 120, 'output')
+        self.assertEquals(None, cache.get('a'))
+        self.assertEquals(([], 0), (list(cache.entries), cache.size))
+
+        # results read from disk expire with their file
+        cache = ResultCache(directory=self.directory, ttl=60)
+        ResultCache(directory=self.directory).set('b', 'output')
+        created = int(time.time()) - 50
+        os.utime(cache._path('b'), (created, created))
+        self.assertEquals('output', cache.get('b'))
+        self.assertEquals(created, cache.entries['b'][0])
+
+    def testRender(self):
+        cache = ResultCache()
+        renderer = datagrid.renderer.csv_.Renderer()
+        output = DataGrid([[1, 2], [3, 4]], ['a', 'b']).render(renderer)
+        self.assertEquals(output, cache.render(DataGrid([[1, 2], [3, 4]],
+                ['a', 'b']), renderer, self.fingerprint))
+
+        # the same data, configuration and renderer are not rendered again
+        self.assertEquals(output, cache.render(self.grid(),
+                datagrid.renderer.csv_.Renderer(), self.fingerprint))
+        self.assertRaises(TypeError, cache.render, self.grid(sortby=['b']),
+                renderer, self.fingerprint)
+        self.assertRaises(TypeError, cache.render, self.grid(), renderer,
+                content_fingerprint('1,2\n'))
+
+    def testCallableKeys(self):
+        key = lambda suffix: cache_key(self.fingerprint,
+                {'formatters': {'a': suffixed(suffix)}})
+        self.assertEquals(key('%'), key('%'))
+        self.assertNotEquals(key('%'), key('$'))
+
+        # functions differing only in defaults, or bound arguments, are told
+        #   apart too
+        first, second = [lambda v, n=n: v * n for n in (1, 2)]
+        self.assertNotEquals(normalize(first), normalize(second))
+        self.assertNotEquals(normalize(partial(suffixed, '%')),
+                normalize(partial(suffixed, '$')))
+
+
+# Run tests if called from console
+if __name__ == '__main__':
+    unittest.main()
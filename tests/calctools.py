@@ -19,7 +19,11 @@
 """datagrid.calculate test module"""
 
 import unittest
-from datagrid.calctools import calculatevalues, CalculatedValueError
+from datagrid.calctools import calculatevalues, CalculatedValueError, \
+        formula, bool_formula, compile_formula, InvalidFormulaError, \
+        compile_calculations, CircularCalculationError, \
+        compile_column_formula
+from datagrid.columnar import EncodedColumn
 
 class TestCalcTools(unittest.TestCase):
     """CalcTools unit-tests"""
@@ -54,6 +58,73 @@ class TestCalcTools(unittest.TestCase):
         self.assertRaises(CalculatedValueError, 
                 calculatevalues, data, calculations)
 
+    def testCompiledCalculations(self):
+
+        # Chain of calculations given in 'reverse' order
+        columns = ['one', 'two', 'five', 'four', 'three']
+        calculations = {
+                'five': '{one} + {four}',
+                'four': '{one} + {three}',
+                'three': '{one} + {two}'}
+        calculate = compile_calculations(calculations, columns)
+        self.assertEquals([5, 10, 25.0, 20.0, 15.0], calculate([5, 10]))
+
+        # Aggregate rows arrive with calculated columns pre-populated
+        self.assertEquals([5, 10, 25.0, 20.0, 15.0], 
+                calculate([5, 10, '', '', '']))
+
+    def testCircularCalculations(self):
+
+        columns = ['one', 'two', 'three']
+        calculations = {'two': '{three} + 1', 'three': '{two} + {one}'}
+        self.assertRaises(CircularCalculationError,
+                compile_calculations, calculations, columns)
+
+
+class TestFormula(unittest.TestCase):
+    """Formula compiler unit-tests"""
+
+    def testPositionalFormula(self):
+        f = compile_formula('({one} + {three}) / 2', ['one', 'two', 'three'])
+        self.assertEquals(3.0, f([2, 'x', 4]))
+
+        f = compile_formula("{two} in ('a', 'b') and {one} > 1", 
+                ['one', 'two'], numeric=False)
+        self.assertTrue(f([2, 'a']))
+        self.assertFalse(f([2, 'c']))
+
+    def testEncodedColumnFormula(self):
+        # equality tests of encoded columns compare codes
+        columns = [EncodedColumn(['a', 'b', 'a', 'c']), [1, 2, 3, 4]]
+        for calc, expected in [("{s} == 'a'", [0, 2]), 
+                ("'b' != {s}", [0, 2, 3]), ("{s} == 'z'", []),
+                ("{s} in ('a', 'c', 'z') and {n} > 1", [2, 3]),
+                ("{s} not in ['a']", [1, 3]), ("{s} < 'b'", [0, 2])]:
+            f = compile_column_formula(calc, ['s', 'n'], columns, False)
+            self.assertEquals(expected, [i for i in range(4) if f(i)])
+
+    def testUnknownColumn(self):
+        self.assertRaises(KeyError, compile_formula, '{four}', ['one'])
+
+    def testConstantFolding(self):
+        self.assertEquals(10.0, formula('{a} * (2 + -3 * -1)')({'a': 2}))
+        self.assertEquals(0, bool_formula('7 / 2 - 3')({}))
+
+        # powers of columns are computed at run time, and constants too
+        #   large to compute are rejected
+        self.assertEquals(1.0, formula('{a} ** (2 ** 1000)')({'a': 1}))
+        for calc in ['{a} + 9 ** 9 ** 9', '{a} + (1 << 10 ** 10)']:
+            self.assertRaises(InvalidFormulaError, formula, calc)
+            self.assertRaises(ValueError, bool_formula, calc)
+
+    def testRejectUnsafe(self):
+        for calc in ['__import__("os").system("ls")', '{a}.__class__', 
+                'open("/etc/passwd")', '[x for x in {a}]', 'lambda: {a}',
+                'max(*{a})', '{a} +']:
+            self.assertRaises(InvalidFormulaError, bool_formula, calc)
+            self.assertRaises(InvalidFormulaError, formula, calc)
+
+
 # Run tests if called from console
 if __name__ == '__main__':
     unittest.main()
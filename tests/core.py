@@ -20,9 +20,14 @@
 
 import unittest
 import __builtin__
+import json
 
 from datagrid.core import DataGrid
-from datagrid import format
+from datagrid import format, formattools, accumulate, aggregate, window
+from datagrid.columnar import ColumnStore
+from datagrid.vectorized import numpy
+import datagrid.renderer.csv_
+import datagrid.renderer.json_
 
 
 # -- TEST FIXTURES -- #
@@ -73,6 +78,30 @@ class EchoRenderer(object):
         return "[f]" + cells + "[/f]"
 
 
+class StyleEchoRenderer(EchoRenderer):
+    """
+    EchoRenderer that includes row and cell styles in its output
+    """
+
+    def row(self, config, style, cells, level=0, name=None, value=None):
+        return "[r %s]" % style + cells + "[/r]"
+
+    def cell(self, config, style, data, column):
+        return "[c %s]%s[/c]" % (style, data)
+
+
+class StreamEchoRenderer(EchoRenderer):
+    """
+    EchoRenderer that streams output, one chunk per row
+    """
+
+    def stream(self, config, head, body, tail):
+        yield "[t]" + head
+        for row in body:
+            yield row
+        yield tail() + "[/t]"
+
+
 # -- TEST CLASSES -- #
 
 class TestRenderInteract(unittest.TestCase):
@@ -312,6 +341,74 @@ class TestOutput(unittest.TestCase):
         actual = self.grid.render(EchoRenderer())
         self.assertEquals(expected, actual)
 
+    def testMultiGroupRollup(self):
+        # leaf groups are aggregated once, parent groups and totals are 
+        #   merged from their children's partial states
+        updates = []
+        class CountedSum(accumulate.Sum):
+            def update(self, state, values):
+                updates.append(list(values))
+                return accumulate.Sum.update(self, state, values)
+
+        self.grid.data = [[4, 2, 3], [4, 2, 3], [4, 7, 3],  [1, 5, 6]]
+        self.grid.groupby = ['one','two']
+        self.grid.aggregate['two'] = len
+        self.grid.aggregate['three'] = CountedSum()
+        self.grid.suppressdetail = True
+        expected = ("[t][h/]"
+                "[r][c]1[/c][c]1[/c][c]6[/c][/r]"
+                "[r][c]1[/c][c]5[/c][c]6[/c][/r]"
+                "[r][c]4[/c][c]3[/c][c]9[/c][/r]"
+                "[r][c]4[/c][c]2[/c][c]6[/c][/r]"
+                "[r][c]4[/c][c]7[/c][c]3[/c][/r]"
+                "[f][c][/c][c]4[/c][c]15[/c][/f]"
+                "[/t]")
+        actual = self.grid.render(EchoRenderer())
+        self.assertEquals(expected, actual)
+        self.assertEquals([[3], [3, 3], [6]], sorted(updates))
+
+    def testInterleavedGroups(self):
+        # rows of a group need not be adjacent, and keep their order within
+        #   it; groups no detail row passes post_aggregate_filters are dropped
+        self.grid.data = [['b', 'x', 1], ['a', 'y', 2], ['b', 'y', 3], 
+                ['a', 'y', 4], ['b', 'x', 5], ['c', 'x', 9]]
+        self.grid.groupby = ['one', 'two']
+        self.grid.aggregate['three'] = vars(__builtin__)['sum']
+        self.grid.post_aggregate_filters = ['{three} < 9']
+        expected = ("[t][h/]"
+                "[r][c]a[/c][c][/c][c]6[/c][/r]"
+                "[r][c]a[/c][c]y[/c][c]6[/c][/r]"
+                "[r][c]a[/c][c]y[/c][c]2[/c][/r]"
+                "[r][c]a[/c][c]y[/c][c]4[/c][/r]"
+                "[r][c]b[/c][c][/c][c]9[/c][/r]"
+                "[r][c]b[/c][c]x[/c][c]6[/c][/r]"
+                "[r][c]b[/c][c]x[/c][c]1[/c][/r]"
+                "[r][c]b[/c][c]x[/c][c]5[/c][/r]"
+                "[r][c]b[/c][c]y[/c][c]3[/c][/r]"
+                "[r][c]b[/c][c]y[/c][c]3[/c][/r]"
+                "[f][c][/c][c][/c][c]24[/c][/f]"
+                "[/t]")
+        actual = self.grid.render(EchoRenderer())
+        self.assertEquals(expected, actual)
+
+    def testCompositeSort(self):
+        # text sorts case-insensitively and after numbers, ties keep their
+        #   order
+        self.grid.data = [['b', 2, 'r1'], ['A', 1, 'r2'], ['B', 1, 'r3'],
+                ['a', 1, 'r4'], ['b', 1, 'r5'], [10, 1, 'r6']]
+        self.grid.sortby = [('one', 'desc'), 'two']
+        expected = ("[t][h/]"
+                "[r][c]B[/c][c]1[/c][c]r3[/c][/r]"
+                "[r][c]b[/c][c]1[/c][c]r5[/c][/r]"
+                "[r][c]b[/c][c]2[/c][c]r1[/c][/r]"
+                "[r][c]A[/c][c]1[/c][c]r2[/c][/r]"
+                "[r][c]a[/c][c]1[/c][c]r4[/c][/r]"
+                "[r][c]10[/c][c]1[/c][c]r6[/c][/r]"
+                "[f][c][/c][c][/c][c][/c][/f]"
+                "[/t]")
+        actual = self.grid.render(EchoRenderer())
+        self.assertEquals(expected, actual)
+
     def testFilter(self):
         self.grid.data = [[1,2,3],[4,5,6]]
         self.grid.filters = ["{one} == 1"]
@@ -323,6 +420,21 @@ class TestOutput(unittest.TestCase):
         self.assertEquals(expected, actual)
 
 
+    def testStyles(self):
+        self.grid.data = [[1,2,3],[4,5,6]]
+        self.grid.columns = ('one', 'two')
+        self.grid.rowstyles = [('{one} > 1', 'big')]
+        self.grid.cellstyles = [('two', '{two} == 2', 'x;'), 
+                ('two', lambda d: d['three'] == 3, 'y;')]
+        self.grid.columnstyles = [('one', 'a;')]
+        expected = ("[t][h/]"
+                "[r ][c a;]1[/c][c x;y;]2[/c][/r]"
+                "[r big][c a;]4[/c][c ]5[/c][/r]"
+                "[f][c a;][/c][c ][/c][/f]"
+                "[/t]")
+        actual = self.grid.render(StyleEchoRenderer())
+        self.assertEquals(expected, actual)
+
     def testPostAggregateFilter(self):
         self.grid.data = [[1,2,3],[2,2,5], [4,5,6]]
         self.grid.aggregate['one'] = vars(__builtin__)['sum']
@@ -348,6 +460,525 @@ class TestOutput(unittest.TestCase):
         self.assertEquals(expected, actual)
 
 
+class TestNumberFormats(unittest.TestCase):
+
+    def testParsedFormats(self):
+        # values round half up, and each column has a format of its own
+        formatters = formattools.parse_options(['one|number:2',
+                'two|percent:1', 'three|currency'])
+        grid = DataGrid([[1234.565, 0.12345, -1234.5], [-0.005, 1.0, 1e-7],
+                [1234.565, '', 12322.125]], testCols, formatters=formatters,
+                aggregate={'one': sum})
+        expected = ("[t][h/]"
+                "[r][c]1,234.57[/c][c]12.3%[/c][c]$-1,234.50[/c][/r]"
+                "[r][c]-0.01[/c][c]100.0%[/c][c]$0.00[/c][/r]"
+                "[r][c]1,234.57[/c][c][/c][c]$12,322.13[/c][/r]"
+                "[f][c]2,469.13[/c][c][/c][c][/c][/f]"
+                "[/t]")
+        self.assertEquals(expected, grid.render(EchoRenderer()))
+        self.assertFalse(formatters['one'] is 
+                formattools.parse_options(['one|number:2'])['one'])
+
+
+class TestStreamOutput(unittest.TestCase):
+
+    # Grid fixture
+    grid = None
+
+    def setUp(self):
+        """Setup for all tests in class"""
+        self.grid = DataGrid([[1, 2, 3], [4, 5, 6], [1, 5, 6]], testCols,
+                groupby=['one'], aggregate={'two': sum})
+
+    def testIterRender(self):
+        expected = ["[t][h/]",
+                "[r][c]1[/c][c]7[/c][c][/c][/r]",
+                "[r][c]1[/c][c]2[/c][c]3[/c][/r]",
+                "[r][c]1[/c][c]5[/c][c]6[/c][/r]",
+                "[r][c]4[/c][c]5[/c][c][/c][/r]",
+                "[r][c]4[/c][c]5[/c][c]6[/c][/r]",
+                "[f][c][/c][c]12[/c][c][/c][/f][/t]"]
+        actual = list(self.grid.iter_render(StreamEchoRenderer()))
+        self.assertEquals(expected, actual)
+
+    def testIterRenderWithoutStream(self):
+        expected = DataGrid(self.grid.data, testCols, groupby=['one'],
+                aggregate={'two': sum}).render(EchoRenderer())
+        actual = list(self.grid.iter_render(EchoRenderer()))
+        self.assertEquals([expected], actual)
+
+    def testRenderTo(self):
+        from StringIO import StringIO
+        expected = DataGrid(self.grid.data, testCols, groupby=['one'],
+                aggregate={'two': sum}).render(EchoRenderer())
+        buf = StringIO()
+        self.grid.render_to(buf, StreamEchoRenderer())
+        self.assertEquals(expected, buf.getvalue())
+
+
+class TestCompile(unittest.TestCase):
+
+    # Grid fixture
+    grid = None
+
+    def setUp(self):
+        """Setup for all tests in class"""
+        self.grid = DataGrid([[1, 2, 3], [4, 5, 6], [1, 5, 6]], testCols,
+                groupby=['one'], aggregate={'two': sum}, filters=['{two} > 2'],
+                formatters={'two': str}, sortby=[('three', 'desc')])
+
+    def testRenderTwice(self):
+        expected = ("[t][h/]"
+                "[r][c]1[/c][c]5[/c][c][/c][/r]"
+                "[r][c]1[/c][c]5[/c][c]6[/c][/r]"
+                "[r][c]4[/c][c]5[/c][c][/c][/r]"
+                "[r][c]4[/c][c]5[/c][c]6[/c][/r]"
+                "[f][c][/c][c]10[/c][c][/c][/f][/t]")
+        self.assertEquals(expected, self.grid.render(EchoRenderer()))
+        self.assertEquals(expected, self.grid.render(EchoRenderer()))
+        self.assertEquals([expected], 
+                list(self.grid.iter_render(EchoRenderer())))
+
+        # grid settings are left as they were given
+        self.assertEquals(3, len(self.grid.data))
+        self.assertEquals({'two': sum}, self.grid.aggregate)
+        self.assertEquals([('three', 'desc')], self.grid.sortby)
+        self.assertEquals([], self.grid.columns)
+
+    def testCompileCached(self):
+        self.grid.staticdata = True
+        result = self.grid.compile()
+        self.assertTrue(result is self.grid.compile())
+        self.assertFalse(result is self.grid.compile(refresh=True))
+
+        # changed settings compile again
+        self.grid.aggregate['two'] = max
+        self.assertEquals(('', 5, ''), self.grid.compile().tail.data)
+
+    def testChangedData(self):
+        # rows changed in place compile again, unless declared static
+        expected = self.grid.render(EchoRenderer())
+        self.grid.data[1][1] = 7
+        changed = self.grid.render(EchoRenderer())
+        self.assertTrue("[c]7[/c]" in changed)
+        self.assertNotEquals(expected, changed)
+
+        self.grid.staticdata = True
+        self.grid.data[1][1] = 9
+        self.assertEquals(changed, self.grid.render(EchoRenderer()))
+        self.grid.compile(refresh=True)
+        self.assertTrue("[c]9[/c]" in self.grid.render(EchoRenderer()))
+
+    def testResultTree(self):
+        result = self.grid.compile()
+        self.assertEquals(('one', 'two', 'three'), result.columns)
+        self.assertEquals([1, 4], [group.row.value for group in result.body])
+        self.assertEquals([(1, 5, ''), (1, 5, 6), (4, 5, ''), (4, 5, 6)],
+                [row.data for row in result.rows()])
+        self.assertEquals((('', 1), ('', '5'), ('', 6)), 
+                result.body[0].children[0].cells)
+
+
+class TestWindowOutput(unittest.TestCase):
+
+    # Grid fixture
+    grid = None
+
+    def setUp(self):
+        """Setup for all tests in class"""
+        self.grid = DataGrid([[1, 2, 3], [4, 5, 6], [1, 5, 6], [2, 1, 9], 
+                [4, 4, 4]], testCols, sortby=[('two', 'desc')])
+
+    def testLimitOffset(self):
+        formatted = []
+        def formatter(value):
+            formatted.append(value)
+            return value
+        self.grid.formatters = {'three': formatter}
+        self.grid.limit = 2
+        self.grid.offset = 1
+        expected = ("[t][h/]"
+                "[r][c]1[/c][c]5[/c][c]6[/c][/r]"
+                "[r][c]4[/c][c]4[/c][c]4[/c][/r]"
+                "[f][c][/c][c][/c][c][/c][/f]"
+                "[/t]")
+        self.assertEquals(expected, self.grid.render(EchoRenderer()))
+
+        # rows outside the window are not formatted
+        self.assertEquals([6, 4], formatted)
+
+    def testBatchFormatter(self):
+        slices = []
+        class Formatter(object):
+            def __call__(self, value):
+                return 'scalar'
+            def batch(self, values):
+                slices.append(list(values))
+                return ['#%s' % v for v in values]
+        self.grid.data[1][2] = ''
+        self.grid.formatters = {'three': Formatter()}
+        self.grid.limit = 3
+        expected = ("[t][h/]"
+                "[r][c]4[/c][c]5[/c][c][/c][/r]"
+                "[r][c]1[/c][c]5[/c][c]#6[/c][/r]"
+                "[r][c]4[/c][c]4[/c][c]#4[/c][/r]"
+                "[f][c][/c][c][/c][c][/c][/f]"
+                "[/t]")
+        self.assertEquals(expected, self.grid.render(EchoRenderer()))
+
+        # detail rows are formatted a column at a time, empty values aside
+        self.assertEquals([[6, 4]], slices)
+
+    def testGroupLevelLimit(self):
+        # two groups, at most one detail row each; totals cover all rows
+        self.grid.groupby = ['one']
+        self.grid.aggregate = {'three': sum}
+        self.grid.sortby = [('three', 'desc'), ('two', 'desc')]
+        self.grid.limit = [2, 1]
+        expected = ("[t][h/]"
+                "[r][c]4[/c][c][/c][c]10[/c][/r]"
+                "[r][c]4[/c][c]5[/c][c]6[/c][/r]"
+                "[r][c]1[/c][c][/c][c]9[/c][/r]"
+                "[r][c]1[/c][c]5[/c][c]6[/c][/r]"
+                "[f][c][/c][c][/c][c]28[/c][/f]"
+                "[/t]")
+        self.assertEquals(expected, self.grid.render(EchoRenderer()))
+
+        self.grid.offset = [1]
+        self.assertEquals([(1, '', 9), (1, 5, 6), (2, '', 9), (2, 1, 9)],
+                [row.data for row in self.grid.compile().rows()])
+
+
+class TestGroupingSets(unittest.TestCase):
+
+    # Grid fixture
+    grid = None
+
+    def setUp(self):
+        """Setup for all tests in class"""
+        self.grid = DataGrid([['n', 'm', 1], ['n', 'f', 2], ['s', 'm', 3],
+                ['s', 'm', 4], ['e', 'f', 5]], ['region', 'sex', 'v'],
+                aggregate={'v': sum})
+
+    def testCube(self):
+        self.grid.cube = ['region', 'sex']
+        result = self.grid.compile()
+        self.assertEquals([('region', 'sex'), ('region',), ('sex',), ()],
+                list(result.sets))
+        self.assertEquals({('n', 'm'): ('n', 'm', 1), ('n', 'f'):
+                ('n', 'f', 2), ('s', 'm'): ('s', 'm', 7), ('e', 'f'):
+                ('e', 'f', 5)}, result.aggregates(['region', 'sex']))
+        self.assertEquals({('m',): ('', 'm', 8), ('f',): ('', 'f', 7)},
+                result.aggregates(['sex']))
+        self.assertEquals(15, result.tail.data[2])
+
+    def testRollupRender(self):
+        self.grid.rollup = ['region', 'sex']
+        self.grid.groupingsets = [['sex']]
+        self.grid.sortby = [('v', 'desc')]
+        expected = ("[t][h/]"
+                "[r][c](sex)[/c][c]m[/c][c]8[/c][/r]"
+                "[r][c](sex)[/c][c]f[/c][c]7[/c][/r]"
+                "[r][c](region, sex)[/c][c]m[/c][c]7[/c][/r]"
+                "[r][c](region, sex)[/c][c]f[/c][c]5[/c][/r]"
+                "[r][c](region, sex)[/c][c]f[/c][c]2[/c][/r]"
+                "[r][c](region, sex)[/c][c]m[/c][c]1[/c][/r]"
+                "[r][c](region)[/c][c][/c][c]7[/c][/r]"
+                "[r][c](region)[/c][c][/c][c]5[/c][/r]"
+                "[r][c](region)[/c][c][/c][c]3[/c][/r]"
+                "[r][c]()[/c][c][/c][c]15[/c][/r]"
+                "[f][c][/c][c][/c][c]15[/c][/f]"
+                "[/t]")
+        self.grid.columns = ['sex', 'v']
+        self.assertEquals(expected, self.grid.render(EchoRenderer()))
+
+    def testRollupCsvJson(self):
+        # a single table: one header, the grand total as a row
+        self.grid.rollup = ['region']
+        self.grid.sortby = ['region']
+        self.grid.columns = ['region', 'v']
+        self.assertEquals(['grouping set,region,v', '(region),e,5',
+                '(region),n,3', '(region),s,7', '(),,15'], 
+                self.grid.render(datagrid.renderer.csv_.Renderer()
+                ).splitlines())
+        self.assertEquals([['grouping set', 'region', 'v'], 
+                ['(region)', 'e', 5], ['(region)', 'n', 3],
+                ['(region)', 's', 7], ['()', '', 15]], 
+                json.loads(self.grid.render(
+                datagrid.renderer.json_.Renderer())))
+
+    def testGroupByConflict(self):
+        self.grid.rollup = ['region']
+        self.grid.groupby = ['sex']
+        self.assertRaises(ValueError, self.grid.compile)
+
+
+class TestNulls(unittest.TestCase):
+
+    # Grid settings of the storage tested
+    settings = {}
+
+    def testNulls(self):
+        # nulls (None) are left out of aggregates, are not formatted, sort 
+        #   as empty and render blank
+        grid = DataGrid([['a', 1.0], ['b', None], ['c', 3.0], [None, 2.0]], 
+                ['n', 'v'], aggregate={'v': sum}, 
+                formatters={'v': lambda v: '#%s' % v}, sortby=['v'],
+                **self.settings)
+        expected = ("[t][h/]"
+                "[r][c]a[/c][c]#1.0[/c][/r]"
+                "[r][c][/c][c]#2.0[/c][/r]"
+                "[r][c]c[/c][c]#3.0[/c][/r]"
+                "[r][c]b[/c][c][/c][/r]"
+                "[f][c][/c][c]#6.0[/c][/f]"
+                "[/t]")
+        self.assertEquals(expected, grid.render(EchoRenderer()))
+
+    def testFilters(self):
+        # nulls compare as None, whatever the storage
+        data = [['n', 5.0], ['s', None], ['e', 50.0], [None, 20.0]]
+        grid = DataGrid(data, ['r', 'v'], filters=['{v} > 10'],
+                **self.settings)
+        expected = ("[t][h/]"
+                "[r][c]e[/c][c]50.0[/c][/r]"
+                "[r][c][/c][c]20.0[/c][/r]"
+                "[f][c][/c][c][/c][/f][/t]")
+        self.assertEquals(expected, grid.render(EchoRenderer()))
+
+        grid = DataGrid(data, ['r', 'v'], groupby=['r'],
+                aggregate={'v': sum}, suppressdetail=True,
+                post_aggregate_filters=['{v} > 40'], **self.settings)
+        expected = ("[t][h/]"
+                "[r][c]e[/c][c]50.0[/c][/r]"
+                "[f][c][/c][c]75.0[/c][/f][/t]")
+        self.assertEquals(expected, grid.render(EchoRenderer()))
+
+
+class TestColumnarNulls(TestNulls):
+    """TestNulls run against columnar storage"""
+    settings = {'columnar': True}
+
+    def testEncodedNulls(self):
+        # text columns holding nulls are still encoded
+        store = ColumnStore([['north', 1.0], [None, 2.0], ['south', None]])
+        self.assertEquals(['EncodedColumn', 'FloatColumn'],
+                [c.__class__.__name__ for c in store.columns])
+        self.assertEquals([None, 2.0], store[1])
+        self.assertEquals(['south', None], store[2])
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestNumpyNulls(TestNulls):
+    """TestNulls run against the numpy backend"""
+    settings = {'backend': 'numpy'}
+
+
+class TestPivot(unittest.TestCase):
+
+    # Grid fixture
+    grid = None
+
+    def setUp(self):
+        """Setup for all tests in class"""
+        self.grid = DataGrid([['n', 2009, 1], ['n', 2010, 2], ['s', 2009, 3],
+                ['s', 2009, 4], ['e', 2011, 5]], ['region', 'year', 'v'],
+                pivot=(['region'], 'year', 'v', sum))
+
+    def testPivot(self):
+        result = self.grid.compile()
+        self.assertEquals(('region', '2009', '2010', '2011'), result.columns)
+        self.assertEquals([('e', '', '', 5), ('n', 1, 2, ''),
+                ('s', 7, '', '')], [row.data for row in result.rows()])
+        self.assertEquals(('', 8, 2, 5), result.tail.data)
+
+    def testPivotSettings(self):
+        self.grid.filters = ['{v} > 1']
+        self.grid.formatters = {'v': lambda v: '#%s' % v,
+                '2011': lambda v: '$%s' % v}
+        self.grid.columnstyles = [('v', 'n')]
+        self.grid.sortby = ['2009']
+        self.grid.columns = ['region', '2009', '2011']
+        expected = ("[t][h/]"
+                "[r ][c ]s[/c][c n]#7[/c][c n][/c][/r]"
+                "[r ][c ]e[/c][c n][/c][c n]$5[/c][/r]"
+                "[r ][c ]n[/c][c n][/c][c n][/c][/r]"
+                "[f][c ][/c][c n]#7[/c][c n]$5[/c][/f]"
+                "[/t]")
+        self.assertEquals(expected, self.grid.render(StyleEchoRenderer()))
+
+    def testPivotColumnarAverage(self):
+        self.grid.data = ColumnStore([r[:2] + [float(r[2])] 
+                for r in self.grid.data])
+        self.grid.columnar = True
+        self.grid.pivot = (['region'], 'year', 'v', aggregate.avg)
+        self.assertEquals(('', 8 / 3.0, 2, 5), self.grid.compile().tail.data)
+
+
+class TestWindowColumns(unittest.TestCase):
+
+    # Grid fixture
+    grid = None
+
+    def setUp(self):
+        """Setup for all tests in class"""
+        self.grid = DataGrid([['n', 1.0], ['n', 2.0], ['s', 3.0],
+                ['s', 4.0], ['e', 5.0], ['n', 6.0]], ['region', 'v'],
+                aggregate={'v': sum}, sortby=[('v', 'desc')],
+                columns=['region', 'v', 'run', 'pct', 'rank'],
+                windowcolumns={'run': window.running_sum('v'),
+                        'pct': window.percent_of_total('v'),
+                        'rank': window.rank('v')})
+
+    def displayed(self):
+        """Return display column values of each detail row"""
+        result = self.grid.compile()
+        columns = [result.allcolumns.index(c) for c in result.columns]
+        return [tuple(row.data[i] for i in columns) for row in result.rows()
+                if row.name is None]
+
+    def testGroupPartitions(self):
+        self.grid.groupby = ['region']
+        self.assertEquals([
+                ('n', 6.0, 6.0, 6.0 / 9, 1), ('n', 2.0, 8.0, 2.0 / 9, 2),
+                ('n', 1.0, 9.0, 1.0 / 9, 3), ('s', 4.0, 4.0, 4.0 / 7, 1),
+                ('s', 3.0, 7.0, 3.0 / 7, 2), ('e', 5.0, 5.0, 1.0, 1)],
+                self.displayed())
+
+    def testPostFilterWindow(self):
+        # windows see every row; post filters and the display window follow
+        self.grid.post_aggregate_filters = ['{rank} > 1']
+        self.grid.limit = 2
+        self.grid.offset = 1
+        self.grid.formatters = {'pct': format.percent}
+        expected = ("[t][h/]"
+                "[r][c]s[/c][c]4.0[/c][c]15.0[/c][c]19%[/c][c]3[/c][/r]"
+                "[r][c]s[/c][c]3.0[/c][c]18.0[/c][c]14%[/c][c]4[/c][/r]"
+                "[f][c][/c][c]21.0[/c][c][/c][c][/c][c][/c][/f]"
+                "[/t]")
+        self.assertEquals(expected, self.grid.render(EchoRenderer()))
+
+    def testStreamedWindow(self):
+        self.grid.data = iter(self.grid.data)
+        self.grid.sortby = []
+        self.grid.windowcolumns = {'run': window.running_sum('v'),
+                'pct': window.moving_avg('v', 2),
+                'rank': window.rank('region')}
+        self.assertEquals([('n', 1.0, 1.0, 1.0, 1), ('n', 2.0, 3.0, 1.5, 1),
+                ('s', 3.0, 6.0, 2.5, 3), ('s', 4.0, 10.0, 3.5, 3),
+                ('e', 5.0, 15.0, 4.5, 5), ('n', 6.0, 21.0, 5.5, 6)],
+                self.displayed())
+
+    def testSortOnWindow(self):
+        self.grid.sortby = ['run']
+        self.assertRaises(ValueError, self.grid.compile)
+
+
+class TestColumnarOutput(TestOutput):
+    """TestOutput run against columnar storage"""
+
+    def setUp(self):
+        """Setup for all tests in class"""
+        self.grid = DataGrid(testData, testCols, columnar=True)
+
+
+class TestExternalOutput(TestOutput):
+    """TestOutput run with every row spilled to disk (and sorted externally)
+    """
+
+    def setUp(self):
+        """Setup for all tests in class"""
+        self.grid = DataGrid(testData, testCols, sortmemory=0)
+
+    def testSpooledData(self):
+        self.assertEquals(2, len(self.grid.data))
+        self.assertTrue(self.grid.data.file is not None)
+        self.grid.sortby = [('one', 'desc')]
+        self.grid.aggregate['two'] = max
+        result = self.grid.compile()
+        self.assertEquals([('4', '5', '6'), ('1', '2', '3')],
+                [row.data for row in result.rows()])
+        self.assertEquals([('4', '5', '6'), ('1', '2', '3')],
+                [row.data for row in result.rows()])
+        self.assertEquals(('', '5', ''), result.tail.data)
+
+    def testNullSort(self):
+        # sorted runs merge in the order rows are sorted in memory
+        data = [[float(i % 3), float(i % 7), 'r%s' % i] for i in xrange(60)]
+        data[20][0] = data[30][1] = data[40][2] = None
+        settings = dict(sortby=[('cnt', 'desc'), 'amt', 'n'])
+        expected = DataGrid([list(row) for row in data],
+                ['cnt', 'amt', 'n'], **settings).render(EchoRenderer())
+        grid = DataGrid([list(row) for row in data], ['cnt', 'amt', 'n'],
+                sortmemory=1000, **settings)
+        self.assertTrue(grid.data.file is not None)
+        self.assertEquals(expected, grid.render(EchoRenderer()))
+        self.assertTrue(expected.startswith('[t][h/][r][c][/c]'))
+
+
+class TestIteratorOutput(TestOutput):
+    """TestOutput run against data read lazily from an iterator"""
+
+    def setUp(self):
+        """Setup for all tests in class"""
+        self.grid = DataGrid(iter(testData), testCols)
+
+    def testLazyRead(self):
+        # rows are read (in chunks) only as the body is rendered
+        read = []
+        def rows():
+            for i in xrange(5000):
+                read.append(i)
+                yield [i, i + 1, i + 2]
+        grid = DataGrid(rows(), testCols, aggregate={'two': max}, limit=1)
+        chunks = grid.iter_render(StreamEchoRenderer())
+        self.assertEquals(['[t][h/]', '[r][c]0[/c][c]1[/c][c]2[/c][/r]'],
+                [chunks.next(), chunks.next()])
+        self.assertTrue(len(read) < 5000)
+        self.assertEquals('[f][c][/c][c]5000[/c][c][/c][/f][/t]', 
+                list(chunks)[-1])
+        self.assertEquals(5000, len(read))
+        self.assertRaises(ValueError, grid.render, EchoRenderer())
+
+
+class TestParallelOutput(TestOutput):
+    """TestOutput run with groups compiled across a process pool"""
+
+    def setUp(self):
+        """Setup for all tests in class"""
+        self.grid = DataGrid(testData, testCols, parallel=2)
+
+    def testMultiGroupRollup(self):
+        # accumulators are updated in the pool workers, out of the parent's
+        #   sight; check the rolled up output only
+        self.grid.data = [[4, 2, 3], [4, 2, 3], [4, 7, 3],  [1, 5, 6]]
+        self.grid.groupby = ['one','two']
+        self.grid.aggregate['two'] = len
+        self.grid.aggregate['three'] = accumulate.Sum()
+        self.grid.suppressdetail = True
+        expected = ("[t][h/]"
+                "[r][c]1[/c][c]1[/c][c]6[/c][/r]"
+                "[r][c]1[/c][c]5[/c][c]6[/c][/r]"
+                "[r][c]4[/c][c]3[/c][c]9[/c][/r]"
+                "[r][c]4[/c][c]2[/c][c]6[/c][/r]"
+                "[r][c]4[/c][c]7[/c][c]3[/c][/r]"
+                "[f][c][/c][c]4[/c][c]15[/c][/f]"
+                "[/t]")
+        self.assertEquals(expected, self.grid.render(EchoRenderer()))
+
+    def testParallelGroups(self):
+        data = [[i % 7, i % 3, i] for i in xrange(100)]
+        serial = DataGrid(data, testCols, groupby=['one', 'two'], 
+                aggregate={'three': vars(__builtin__)['sum']},
+                sortby=[('three', 'desc')], filters=['{three} > 10'],
+                limit=[4, 2])
+        self.grid.data = data
+        for name in ('groupby', 'aggregate', 'sortby', 'filters', 'limit'):
+            setattr(self.grid, name, getattr(serial, name))
+        self.assertEquals([row.data for row in serial.compile().rows()],
+                [row.data for row in self.grid.compile().rows()])
+        self.assertEquals(serial.compile().tail, self.grid.compile().tail)
+
+
 class TestCalculatedOutput(unittest.TestCase):
 
     # Grid fixture
@@ -400,6 +1031,38 @@ class TestCalculatedOutput(unittest.TestCase):
         self.assertEquals(expected, actual)
 
 
+class TestColumnarCalculatedOutput(TestCalculatedOutput):
+    """TestCalculatedOutput run against columnar storage"""
+
+    def setUp(self):
+        """Setup for all tests in class"""
+        self.grid = DataGrid(testData, testCols, columnar=True)
+        self.grid.calculatedcolumns = {"four": "{two}+{three}"}
+
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+if numpy is not None:
+    class TestNumpyOutput(TestOutput):
+        """TestOutput run against the numpy backend"""
+
+        def setUp(self):
+            """Setup for all tests in class"""
+            self.grid = DataGrid(testData, testCols, backend='numpy')
+
+
+    class TestNumpyCalculatedOutput(TestCalculatedOutput):
+        """TestCalculatedOutput run against the numpy backend"""
+
+        def setUp(self):
+            """Setup for all tests in class"""
+            self.grid = DataGrid(testData, testCols, backend='numpy')
+            self.grid.calculatedcolumns = {"four": "{two}+{three}"}
+
+
 # Run tests if called from console
 if __name__ == '__main__':
     unittest.main()
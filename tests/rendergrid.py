@@ -0,0 +1,105 @@
+#------------------------------------------------------------------------#
+# DataGrid - Tabular Data Rendering Library
+# Copyright (C) 2009-2010 Adam Wagner <awagner@redventures.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#------------------------------------------------------------------------#
+
+"""rendergrid (command-line) test module"""
+
+import csv
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from datagrid.core import DataGrid
+from datagrid import datatools
+import datagrid.renderer.csv_
+
+
+# Path of the rendergrid executable
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+RENDERGRID = os.path.join(ROOT, 'rendergrid')
+
+
+def rendergrid(*args):
+    """Run rendergrid with args, returning (exit status, output, errors)"""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    process = subprocess.Popen([sys.executable, RENDERGRID] + list(args),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    output, errors = process.communicate()
+    return process.returncode, output, errors
+
+
+class TestRendergrid(unittest.TestCase):
+    """rendergrid unit-tests"""
+
+    def setUp(self):
+        """Setup for all tests in class"""
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Cleanup and prep for next run"""
+        shutil.rmtree(self.directory)
+
+    def datafile(self, rows):
+        """Return path of a csv data file of rows (lists of str)"""
+        path = os.path.join(self.directory, 'data.csv')
+        with open(path, 'w') as datafile:
+            datafile.write(''.join(','.join(row) + '\n' for row in rows))
+        return path
+
+    def testFilterMatchesNothing(self):
+        path = self.datafile([['a', 'b'], ['1', 'x'], ['2', 'y']])
+        status, output, errors = rendergrid('-A', '-F', '{a} > 5',
+                '-a', 'a|sum', '--renderer', 'datagrid.renderer.csv_', path)
+        self.assertEquals((0, ''), (status, errors))
+
+        # the same (empty) result as the grid's own filters give
+        expected = DataGrid([[1.0, 'x'], [2.0, 'y']], ['a', 'b'],
+                aggregate={'a': sum}, filters=['{a} > 5']).render(
+                datagrid.renderer.csv_.Renderer())
+        self.assertEquals(expected, output)
+
+    def testFilterOnPromotedColumn(self):
+        # code is guessed float from the sample, and promoted to str by a
+        #   later row: the filter tests it as text
+        path = self.datafile([['name', 'code'], ['a', '1'], ['b', '2'],
+                ['c', 'x'], ['d', '2']])
+        status, output, errors = rendergrid('-A', '--typesample', '2',
+                '-F', "{code} == '2'", '--renderer',
+                'datagrid.renderer.csv_', path)
+        self.assertEquals((0, ''), (status, errors))
+        self.assertEquals(['name,code', 'b,2', 'd,2'], output.splitlines())
+
+    def testRenderStreamTwice(self):
+        # data read as rendergrid reads it is a one-pass stream: a flat,
+        #   unsorted grid renders it once
+        data = csv.reader(['a,b\n', '1,x\n', '2,y\n'])
+        columns = data.next()
+        sample, data = datatools.sample_rows(data)
+        data = datatools.TypedRows(data, datatools.get_column_types(sample))
+        grid = DataGrid(data, columns, aggregate={'a': sum})
+        renderer = datagrid.renderer.csv_.Renderer()
+        self.assertEquals(['a,b', '1.0,x', '2.0,y'],
+                grid.render(renderer).splitlines())
+        self.assertRaises(ValueError, grid.render, renderer)
+
+
+# Run tests if called from console
+if __name__ == '__main__':
+    unittest.main()
@@ -21,13 +21,13 @@ import sys, os
 sys.path.insert(0, os.path.dirname(__file__) + '/../')
 
 import unittest
-import core, calctools
+import core, calctools, vectorized, approximate, cache, rendergrid
 
 # Create test suite
 suite = unittest.TestSuite()
 
 # Attach all appropriate test-modules
-for module in [core, calctools]:
+for module in [core, calctools, vectorized, approximate, cache, rendergrid]:
     suite.addTest(unittest.TestLoader().loadTestsFromModule(module))
 
 # Begin tests
@@ -0,0 +1,98 @@
+#------------------------------------------------------------------------#
+# DataGrid - Tabular Data Rendering Library
+# Copyright (C) 2009-2010 Adam Wagner <awagner@redventures.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published 
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#------------------------------------------------------------------------#
+
+"""datagrid.vectorized test module (skipped if numpy is not installed)"""
+
+import unittest
+
+import datagrid.aggregate
+from datagrid.accumulate import accumulator
+from datagrid.core import DataGrid
+from datagrid.vectorized import NumpyStore, numpy
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestNumpyStore(unittest.TestCase):
+    """NumpyStore unit-tests"""
+
+    def testRows(self):
+        store = NumpyStore([['a', 1.0, 1], ['b', '', 2], ['a', 3.0, 3]])
+        self.assertEquals(['b', '', 2], store[1])
+        self.assertEquals([1.0, '', 3.0], store.take(1, store.selection()))
+        self.assertEquals([['a', 3.0, 3], ['a', 1.0, 1]],
+                list(store.rows(numpy.array([2, 0]))))
+
+    def testAccumulate(self):
+        store = NumpyStore([['a', 1.0, 1], ['b', '', 2], ['a', 3.0, 4]])
+        selection = store.selection()
+
+        def aggregate(column, method):
+            acc = accumulator(method)
+            return acc.finalize(store.accumulate(column, acc, selection))
+
+        self.assertEquals(4.0, aggregate(1, sum))
+        self.assertEquals(1.0, aggregate(1, min))
+        self.assertEquals(2.0, aggregate(1, datagrid.aggregate.avg))
+
+        # integer averages follow aggregate.avg (integer division)
+        self.assertEquals(2, aggregate(2, datagrid.aggregate.avg))
+        self.assertEquals(2, aggregate(0, datagrid.aggregate.distinct_len))
+        self.assertEquals('2 a, 1 b', aggregate(0, datagrid.aggregate.count))
+
+        # partial states are plain python values
+        self.assertEquals([4.0, 2], store.accumulate(1, accumulator(
+                datagrid.aggregate.avg), selection))
+        self.assertEquals(0, store.accumulate(1, accumulator(sum), 
+                numpy.array([1])))
+
+    def testGroupTree(self):
+        store = NumpyStore([['b', 1.0], ['a', 2.0], ['b', 1.0]])
+        tree = store.group_tree([0, 1], store.selection())
+        self.assertEquals(['a', 'b'], sorted(tree))
+        self.assertEquals([0, 2], tree['b'].items.tolist())
+        self.assertEquals([1.0], tree['b'].children.keys())
+        self.assertEquals([0, 2], tree['b'].children[1.0].items.tolist())
+
+    def testCalculate(self):
+        store = NumpyStore([[1.0, 2], [3.0, 0], ['', 1]])
+        columns = store.calculate({'c': '{b} * 2', 'd': '{a} / {b}'},
+                ['a', 'b', 'c', 'd'])
+        self.assertEquals([[4.0, 0.0, 2.0], [0.5, 0, '--']],
+                [list(c) for c in columns])
+
+        # string columns can not be vectorized
+        store = NumpyStore([['x', 2]])
+        self.assertEquals(None, store.calculate({'c': '{a} * 2'}, 
+                ['a', 'b', 'c']))
+
+    def testChainedCalculateParity(self):
+        # formulas on calculated columns see a division by zero as 0, and
+        #   empty or failed values as failures, as the python backend does
+        data = [[10.0, 2.0], [5.0, 0.0], ['', 1.0], [4.0, '']]
+        calculations = {'ipc': '{income} / {children}', 'x': '{ipc} * 2'}
+        def rows(backend):
+            grid = DataGrid([list(r) for r in data], ['income', 'children'],
+                    calculatedcolumns=calculations, backend=backend)
+            return [row.data for row in grid.compile().rows()]
+        self.assertEquals(rows('python'), rows('numpy'))
+        self.assertEquals((5.0, 0.0, 0, 0), rows('numpy')[1])
+
+
+# Run tests if called from console
+if __name__ == '__main__':
+    unittest.main()